@@ -0,0 +1,104 @@
+from time import perf_counter
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class PathAnimation:
+    """Ball travelling along a path of (y, x) cells, one cell per step"""
+    __slots__ = ("path", "color", "started", "step", "y", "x")
+
+    def __init__(self, path: list, color, started: float):
+        self.path = path
+        self.color = color
+        self.started = started
+        self.step = 0
+        self.y, self.x = path[0]
+
+    @property
+    def end(self):
+        return self.path[-1]
+
+    def advance(self, now: float, step_s: float):
+        """Move to the position at time now, return False once the path is done"""
+        position = (now - self.started) / step_s
+        last = len(self.path) - 1
+        if position >= last:
+            self.step = last
+            self.y, self.x = self.path[-1]
+            return False
+        self.step = int(position)
+        fraction = position - self.step
+        (y0, x0), (y1, x1) = self.path[self.step], self.path[self.step + 1]
+        self.y = y0 + (y1 - y0) * fraction
+        self.x = x0 + (x1 - x0) * fraction
+        return True
+
+
+class Animator(QObject):
+    """Plays ball moves on one shared frame timer, independently of the game logic.
+
+    Positions are taken from the clock on every frame, so a slow frame skips ahead
+    instead of slowing the move down. In instant mode moves are not animated at all.
+    """
+    FRAME_MS = 16
+
+    # Emitted with (previous positions, animations) after positions changed
+    frame = pyqtSignal(list, list)
+    # Emitted every time a ball enters the next cell of its path
+    step_passed = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, step_ms: int, instant: bool = False, parent: QObject = None):
+        super(Animator, self).__init__(parent)
+        self.step_ms = step_ms
+        self.instant = instant
+        self.animations = []
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.tick)
+
+    @property
+    def running(self):
+        return bool(self.animations)
+
+    def set_instant(self, instant: bool):
+        self.instant = instant
+        if instant:
+            self.skip()
+
+    def animate(self, path: list, color):
+        if self.instant or self.step_ms <= 0 or len(path) < 2:
+            return
+        self.animations.append(PathAnimation(path, color, perf_counter()))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def tick(self):
+        previous = [(a.y, a.x) for a in self.animations]
+        now = perf_counter()
+        step_s = self.step_ms / 1000
+        steps = [a.step for a in self.animations]
+        running = [a.advance(now, step_s) for a in self.animations]
+        if any(a.step != step for a, step in zip(self.animations, steps)):
+            self.step_passed.emit()
+
+        self.frame.emit(previous, list(self.animations))
+        self.animations = [a for a, alive in zip(self.animations, running) if alive]
+        if not self.animations:
+            self.timer.stop()
+            self.finished.emit()
+
+    def skip(self):
+        """Finish all running animations at once"""
+        if not self.animations:
+            return
+        previous = [(a.y, a.x) for a in self.animations]
+        done = self.animations
+        self.animations = []
+        for a in done:
+            a.step = len(a.path) - 1
+            a.y, a.x = a.end
+        self.timer.stop()
+        self.frame.emit(previous, done)
+        self.finished.emit()
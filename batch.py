@@ -0,0 +1,178 @@
+from time import perf_counter
+
+import numpy as np
+
+from engine import GameEngine
+from lines import EMPTY, line_masks, line_scores
+
+
+class BatchEngine:
+    """Many independent games advanced in lockstep over a (N, HEIGHT, WIDTH) color array.
+
+    Follows GameEngine rules: SPAWN_PER_TURN balls are announced a turn ahead, a ball whose
+    announced cell got taken lands on a random empty cell, lines are checked after every
+    placed ball and a move which completes no line is followed by a spawn.
+    Per-board operations take an array of board indices.
+    """
+    WIDTH = GameEngine.WIDTH
+    HEIGHT = GameEngine.HEIGHT
+    COLORS_ON_FIELD = GameEngine.COLORS_ON_FIELD
+    SPAWN_PER_TURN = GameEngine.SPAWN_PER_TURN
+    ITEMS_IN_LINE = GameEngine.ITEMS_IN_LINE
+
+    def __init__(self, boards: int, width: int = 0, height: int = 0, seed=None):
+        if width != 0:
+            self.WIDTH = width
+        if height != 0:
+            self.HEIGHT = height
+
+        self.rng = np.random.default_rng(seed)
+        self.boards = boards
+        self.grids = np.full((boards, self.HEIGHT, self.WIDTH), EMPTY, dtype=np.int8)
+        self.cells = self.grids.reshape(boards, -1)
+        self.next_positions = np.zeros((boards, self.SPAWN_PER_TURN), dtype=np.intp)
+        self.next_colors = np.zeros((boards, self.SPAWN_PER_TURN), dtype=np.int8)
+
+        self.scores = np.zeros(boards, dtype=np.int64)
+        self.turns = np.zeros(boards, dtype=np.int64)
+        self.lost = np.zeros(boards, dtype=bool)
+
+        self.reset()
+
+    def reset(self, boards=None):
+        """Restart the given boards (all by default) with the first spawn already made"""
+        if boards is None:
+            boards = np.arange(self.boards)
+        self.grids[boards] = EMPTY
+        self.scores[boards] = 0
+        self.turns[boards] = 0
+        self.lost[boards] = False
+        self.announce(boards)
+        self.spawn(boards)
+
+    def _random_cells(self, boards, allowed, n: int):
+        """n distinct random cells per board among allowed ones, -1 where there are too few"""
+        keys = self.rng.random(allowed.shape)
+        keys[~allowed] = 2.0
+        if n < keys.shape[1]:
+            chosen = np.argpartition(keys, n - 1, axis=1)[:, :n]
+        else:
+            chosen = np.argsort(keys, axis=1)[:, :n]
+        chosen[np.take_along_axis(keys, chosen, axis=1) > 1.0] = -1
+        return chosen
+
+    def announce(self, boards):
+        """Choose cells and colors of the next spawn, boards without room for it are lost"""
+        boards = boards[~self.lost[boards]]
+        if not len(boards):
+            return
+        positions = self._random_cells(boards, self.cells[boards] == EMPTY, self.SPAWN_PER_TURN)
+        self.lost[boards[(positions < 0).any(axis=1)]] = True
+        self.next_positions[boards] = positions
+        self.next_colors[boards] = self.rng.integers(0, self.COLORS_ON_FIELD, positions.shape)
+
+    def spawn(self, boards):
+        """Put announced balls on the boards, clearing lines after each of them"""
+        for j in range(self.SPAWN_PER_TURN):
+            boards = boards[~self.lost[boards]]
+            if not len(boards):
+                return
+            positions = self.next_positions[boards, j]
+            taken = self.cells[boards, positions] != EMPTY
+            if taken.any():
+                moved = boards[taken]
+                fallback = self._random_cells(moved, self.cells[moved] == EMPTY, 1)[:, 0]
+                positions[taken] = fallback
+                self.lost[moved[fallback < 0]] = True
+                placed = positions >= 0
+                boards, positions = boards[placed], positions[placed]
+
+            self.cells[boards, positions] = self.next_colors[boards, j]
+            self.clear_lines(boards)
+        self.announce(boards)
+
+    def clear_lines(self, boards):
+        """Remove completed lines and score them. Returns bool array of boards with lines."""
+        grids = self.grids[boards]
+        masks = line_masks(grids, self.ITEMS_IN_LINE)
+        in_line = masks.any(axis=0)
+        has_lines = in_line.any(axis=(1, 2))
+        if has_lines.any():
+            cleared = boards[has_lines]
+            self.scores[cleared] += line_scores(grids[has_lines], masks[:, has_lines])
+            self.grids[cleared] = np.where(in_line[has_lines], EMPTY, grids[has_lines])
+        return has_lines
+
+    def reachable(self, boards, starts):
+        """(len(boards), HEIGHT * WIDTH) bool array of empty cells each start ball can move to"""
+        count = len(boards)
+        empty = self.grids[boards] == EMPTY
+        seeds = np.zeros_like(empty)
+        seeds.reshape(count, -1)[np.arange(count), starts] = True
+        reached = seeds
+        while True:
+            grown = reached.copy()
+            grown[:, 1:] |= reached[:, :-1]
+            grown[:, :-1] |= reached[:, 1:]
+            grown[:, :, 1:] |= reached[:, :, :-1]
+            grown[:, :, :-1] |= reached[:, :, 1:]
+            grown &= empty
+            grown |= seeds
+            if np.array_equal(grown, reached):
+                break
+            reached = grown
+        return (reached & ~seeds).reshape(count, -1)
+
+    def random_moves(self, boards=None):
+        """Random legal move per running board as (boards, starts, ends), end is -1 if the ball is stuck"""
+        if boards is None:
+            boards = np.flatnonzero(~self.lost)
+        starts = self._random_cells(boards, self.cells[boards] != EMPTY, 1)[:, 0]
+        boards, starts = boards[starts >= 0], starts[starts >= 0]
+        ends = self._random_cells(boards, self.reachable(boards, starts), 1)[:, 0]
+        return boards, starts, ends
+
+    def move(self, boards, starts, ends, check: bool = True):
+        """Play one turn on every given board. Returns bool array of boards that made their move.
+
+        With check disabled the moves are trusted to be legal, as random_moves() makes them.
+        """
+        valid = (ends >= 0) & ~self.lost[boards]
+        if check:
+            valid &= self.cells[boards, starts] != EMPTY
+            valid &= self.cells[boards, np.maximum(ends, 0)] == EMPTY
+            if valid.any():
+                reach = self.reachable(boards[valid], starts[valid])
+                valid[valid] = reach[np.arange(len(reach)), ends[valid]]
+
+        moved, starts, ends = boards[valid], starts[valid], ends[valid]
+        self.cells[moved, ends] = self.cells[moved, starts]
+        self.cells[moved, starts] = EMPTY
+        self.turns[moved] += 1
+
+        has_lines = self.clear_lines(moved)
+        self.spawn(moved[~has_lines])
+        return valid
+
+    def step(self):
+        """Make a random move on every running board"""
+        boards, starts, ends = self.random_moves()
+        return self.move(boards, starts, ends, check=False)
+
+
+def benchmark(boards: int = 1000, turns: int = 100, size: int = 10, seed: int = 0):
+    """Throughput of random self-play in board-turns per second, lost boards get restarted"""
+    engine = BatchEngine(boards, size, size, seed=seed)
+    made = 0
+    start = perf_counter()
+    for _ in range(turns):
+        made += int(engine.step().sum())
+        lost = np.flatnonzero(engine.lost)
+        if len(lost):
+            engine.reset(lost)
+    return made / (perf_counter() - start)
+
+
+if __name__ == "__main__":
+    for boards in (100, 1000, 10000):
+        print(f"{boards} boards of 10x10: {benchmark(boards, turns=50):,.0f} board-turns/s")
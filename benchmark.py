@@ -0,0 +1,244 @@
+"""Timings of the game hot paths across board sizes and fill levels.
+
+Run standalone to write a JSON report and optionally compare it against a stored one:
+
+    python benchmark.py --output bench.json --baseline baseline.json
+
+or under pytest (`python -m pytest benchmark.py`) for a quick smoke run of every case.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from random import Random
+from statistics import mean, median
+from time import perf_counter
+
+import numpy as np
+
+from engine import GameEngine
+from enums import GameDifficulty, GameStatus
+from lines import EMPTY
+from tableContainer import TableContainer
+
+try:
+    from game_logic import GameField
+except ImportError:
+    GameField = None
+
+SIZES = [d.value for d in GameDifficulty] + [(50, 50), (100, 100), (200, 200)]
+FILLS = [0.25, 0.5, 0.75]
+# GameField cases resync every cell between runs, so they run on the smaller boards only
+QT_MAX_CELLS = 50 * 50
+GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game.py")
+
+
+def make_board(height: int, width: int, fill: float, seed: int = 0):
+    """Engine with a random position without completed lines and with the next spawn announced"""
+    engine = GameEngine(width, height, Random(seed))
+    rng = np.random.default_rng(seed)
+    grid = np.where(rng.random((height, width)) < fill,
+                    rng.integers(0, engine.COLORS_ON_FIELD, (height, width)), EMPTY).astype(np.int8)
+    engine.load_grid(grid)
+    engine.clear_lines(engine.completed_lines())
+    engine.score = 0
+    engine.place_next_colors()
+    return engine
+
+
+def random_moves(engine: GameEngine, count: int, rng: Random):
+    """Legal (start, end) moves of the position"""
+    moves = []
+    balls = engine.filled_cells()
+    for _ in range(count * 20):
+        start = rng.choice(balls)
+        targets = np.argwhere(engine.reachable_mask(start)).tolist()
+        if targets:
+            moves.append((start, tuple(rng.choice(targets))))
+            if len(moves) == count:
+                break
+    return moves
+
+
+def measure(func, args_list: list, setup=None):
+    """Seconds per call of func for every args tuple, setup runs untimed before each call"""
+    times = []
+    for args in args_list:
+        if setup:
+            setup()
+        start = perf_counter()
+        func(*args)
+        times.append(perf_counter() - start)
+    return times
+
+
+def engine_cases(height: int, width: int, fill: float, runs: int):
+    engine = make_board(height, width, fill)
+    rng = Random(1)
+    grid, next_positions = engine.grid.copy(), list(engine.next_positions)
+
+    def restore():
+        engine.load_grid(grid)
+        engine.next_positions = list(next_positions)
+        engine.status = GameStatus.RUNNING
+
+    empty, filled = engine.empty_cells(), engine.filled_cells()
+    pairs = [(rng.choice(filled), rng.choice(empty)) for _ in range(runs)] if empty and filled else []
+    moves = random_moves(engine, runs, rng) if empty and filled else []
+
+    yield "engine.find_path", lambda: measure(engine.find_path, pairs)
+    yield "engine.lines_through", lambda: measure(engine.lines_through, [rng.choice(filled) for _ in range(runs)])
+    yield "engine.empty_cells", lambda: measure(engine.empty_cells, [()] * runs)
+    yield "engine.spawn", lambda: measure(engine.spawn, [()] * runs, restore)
+    yield "engine.turn", lambda: measure(engine.move, moves, restore)
+
+
+def container_cases(height: int, width: int, runs: int):
+    cells = [(y, x) for y in range(height) for x in range(width)]
+    container = TableContainer(height, width)
+
+    def read_all(read):
+        for cell in cells:
+            read(cell)
+
+    def scan(views):
+        for view in views:
+            view.max()
+
+    yield "TableContainer.all_cells", lambda: measure(read_all, [(container.__getitem__,)] * runs)
+    yield "TableContainer.row_views", lambda: measure(scan, [(container.rows,)] * runs)
+    yield "TableContainer.column_views", lambda: measure(scan, [(container.columns,)] * runs)
+    yield "TableContainer.diagonal_views", lambda: measure(
+        scan, [(container.diagonals + container.anti_diagonals,)] * runs)
+
+
+def field_cases(height: int, width: int, fill: float, runs: int):
+    field = GameField(width, height, seed=0)
+    board = make_board(height, width, fill)
+
+    def restore():
+        field.engine.load_grid(board.grid)
+        field.engine.next_positions = list(board.next_positions)
+        field.engine.status = GameStatus.RUNNING
+        for y in range(height):
+            for x in range(width):
+                field.sync_cell(y, x)
+
+    restore()
+    rng = Random(1)
+    empty, filled = field.find_empty_cells(), field.find_filled_cells()
+    pairs = [(rng.choice(filled), rng.choice(empty)) for _ in range(runs)] if empty and filled else []
+
+    yield "GameField.find_path", lambda: measure(field.find_path, pairs)
+    yield "GameField.cell_is_in_line", lambda: measure(field.cell_is_in_line, [(rng.choice(filled),) for _ in range(runs)])
+    yield "GameField.find_empty_cells", lambda: measure(field.find_empty_cells, [()] * runs)
+    yield "GameField.spawn_items", lambda: measure(field.spawn_items, [()] * runs, restore)
+
+
+def startup_time():
+    """Seconds from launching the game to the first paint of its window, None if it could not start.
+
+    Without a display the game runs on the offscreen platform, unless QT_QPA_PLATFORM says otherwise.
+    """
+    env = {**os.environ, "QT_QPA_PLATFORM": os.environ.get("QT_QPA_PLATFORM", "offscreen")}
+    started = time.time()
+    try:
+        result = subprocess.run([sys.executable, GAME, "--startup-time"], capture_output=True, text=True,
+                                check=True, timeout=60, env=env)
+        return float(result.stdout.split()[-1]) - started
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError) as e:
+        print(f"startup.first_paint skipped: {e}", file=sys.stderr)
+        return None
+
+
+def startup_times(runs: int):
+    times = []
+    for _ in range(runs):
+        seconds = startup_time()
+        if seconds is None:
+            # run_all() leaves out cases without timings
+            return []
+        times.append(seconds)
+    return times
+
+
+def cases(runs: int = 50, sizes: list = None, fills: list = None):
+    """(name, run) of every benchmark, run() returns a list of seconds per call"""
+    if GameField is not None:
+        yield "startup.first_paint", lambda: startup_times(max(1, runs // 10))
+    for height, width in sizes or SIZES:
+        board = f"{height}x{width}"
+        for fill in fills or FILLS:
+            for name, run in engine_cases(height, width, fill, runs):
+                yield f"{name}/{board}/{fill:.0%}", run
+            if GameField is not None and height * width <= QT_MAX_CELLS:
+                for name, run in field_cases(height, width, fill, runs):
+                    yield f"{name}/{board}/{fill:.0%}", run
+        for name, run in container_cases(height, width, max(1, runs // 10)):
+            yield f"{name}/{board}", run
+
+
+def run_all(runs: int = 50, sizes: list = None, fills: list = None, verbose: bool = True):
+    results = {}
+    for name, run in cases(runs, sizes, fills):
+        times = run()
+        if not times:
+            continue
+        results[name] = {"mean": mean(times), "median": median(times), "min": min(times), "runs": len(times)}
+        if verbose:
+            print(f"{name:50} median {results[name]['median'] * 1000:9.3f} ms")
+    return {
+        "meta": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform()},
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2):
+    """Names of benchmarks whose median got slower than baseline by more than tolerance"""
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:50} {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark game hot paths")
+    parser.add_argument("-o", "--output", help="write JSON report to this file")
+    parser.add_argument("-b", "--baseline", help="JSON report to compare against")
+    parser.add_argument("-r", "--runs", type=int, default=50, help="calls per benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against baseline")
+    args = parser.parse_args()
+
+    report = run_all(args.runs)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            if compare(report, json.load(file), args.tolerance):
+                sys.exit(1)
+
+
+def pytest_generate_tests(metafunc):
+    if "benchmark_case" in metafunc.fixturenames:
+        quick = list(cases(runs=3, sizes=[(10, 10), (50, 50)], fills=[0.5]))
+        metafunc.parametrize("benchmark_case", [run for _, run in quick], ids=[name for name, _ in quick])
+
+
+def test_benchmark(benchmark_case):
+    times = benchmark_case()
+    assert all(t >= 0 for t in times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import random
+from array import array
+
+
+class EmptyCellIndex:
+    """Set of empty flat cell indices with O(1) add, remove, count and random pick.
+
+    Empty cells are packed in cells[:count], positions maps every cell to its slot in cells,
+    so removing a cell swaps it with the last empty one. Random picks depend on the order of
+    cells[:count], so whoever needs to reproduce them has to keep that order too.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # Arrays take 4 bytes per cell where lists of ints take dozens
+        self.cells = array("i", range(size))
+        self.positions = array("i", range(size))
+        self.count = size
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, index: int):
+        return self.positions[index] < self.count
+
+    def __iter__(self):
+        return iter(self.cells[:self.count])
+
+    def _swap(self, slot_a: int, slot_b: int):
+        cells, positions = self.cells, self.positions
+        a, b = cells[slot_a], cells[slot_b]
+        cells[slot_a], cells[slot_b] = b, a
+        positions[a], positions[b] = slot_b, slot_a
+
+    def add(self, index: int):
+        slot = self.positions[index]
+        if slot >= self.count:
+            self._swap(slot, self.count)
+            self.count += 1
+
+    def remove(self, index: int):
+        slot = self.positions[index]
+        if slot < self.count:
+            self.count -= 1
+            self._swap(slot, self.count)
+
+    def slot(self, index: int):
+        return self.positions[index]
+
+    def restore(self, index: int, slot: int):
+        """Add a cell back to the slot remove() took it from, so the order of empty cells is as before"""
+        self.add(index)
+        self._swap(self.positions[index], slot)
+
+    def load(self, order: list):
+        """Refill the index with the given empty cells in this order"""
+        self.count = 0
+        for index in order:
+            self.add(index)
+
+    def rebuild(self, empty):
+        """Refill the index from a flat bool array of empty cells"""
+        self.count = 0
+        for index, is_empty in enumerate(empty.tolist()):
+            if is_empty:
+                self.add(index)
+            else:
+                self.remove(index)
+
+    def choice(self, rng=random):
+        """Random empty cell, IndexError if there is none"""
+        if not self.count:
+            raise IndexError("No empty cells")
+        return self.cells[rng.randrange(self.count)]
+
+    def sample(self, n: int, rng=random):
+        """n distinct random empty cells, ValueError if there are not enough of them"""
+        return [self.cells[slot] for slot in rng.sample(range(self.count), n)]
@@ -0,0 +1,203 @@
+import json
+import os
+from glob import glob
+
+import numpy as np
+
+from savegame import write_atomic
+
+VERSION = 1
+INDEX = "index.json"
+
+# Fixed columns get a row per turn, "board" is shaped like the grid
+COLUMNS = {
+    "game": np.int64,
+    "turn": np.int32,
+    "board": np.int8,
+    "move": np.int32,
+    "score": np.int64,
+    "spawned_end": np.int64,
+    "lines_end": np.int64,
+}
+# Ragged columns hold any number of values per turn, row i ends at <name>_end[i]
+RAGGED = {
+    "spawned": np.int32,
+    "lines": np.int16,
+}
+
+
+class DatasetError(ValueError):
+    pass
+
+
+def _row_shape(name: str, width: int, height: int):
+    if name == "board":
+        return height, width
+    return (2,) if name in ("move", "spawned") else ()
+
+
+class DatasetWriter:
+    """Append-only store of played turns, one raw file per column.
+
+    Every turn is a row: game id, turn number, the board before the move, the move as
+    flat (start, end) cell indices, (-1, -1) for the opening spawn of a game, and the score
+    after it. Spawned balls as (cell, color) pairs and the lengths of cleared lines are ragged
+    columns. Rows are buffered in chunk sized arrays and appended to the files on flush(),
+    then index.json is replaced to cover them, so readers only see whole flushed turns.
+    Opening an existing store appends to it.
+    """
+
+    def __init__(self, path: str, width: int, height: int, chunk: int = 4096):
+        self.path = path
+        self.width = width
+        self.shapes = {name: _row_shape(name, width, height) for name in {**COLUMNS, **RAGGED}}
+        self.chunk = chunk
+        self.buffers = {name: np.empty((chunk,) + self.shapes[name], dtype) for name, dtype in COLUMNS.items()}
+        self.ragged = {name: [] for name in RAGGED}
+        self.buffered = 0
+
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX)
+        if os.path.exists(index_path):
+            index = read_index(path)
+            if (index["height"], index["width"]) != (height, width):
+                raise DatasetError(f"Dataset is {index['width']}x{index['height']}, the board is {width}x{height}")
+        else:
+            index = {"version": VERSION, "width": width, "height": height, "rows": 0,
+                     "columns": {name: 0 for name in {**COLUMNS, **RAGGED}}}
+        self.index = index
+        self.ends = {name: index["columns"][name] for name in RAGGED}
+
+        self.files = {}
+        for name, dtype in {**COLUMNS, **RAGGED}.items():
+            file = open(self._file_name(name), "ab")
+            # Drop what an interrupted flush wrote past the index
+            file.truncate(index["columns"][name] * self._row_size(name))
+            self.files[name] = file
+
+    def _file_name(self, name: str):
+        return os.path.join(self.path, name + ".bin")
+
+    def _row_size(self, name: str):
+        return int(np.prod(self.shapes[name], dtype=np.int64)) * np.dtype({**COLUMNS, **RAGGED}[name]).itemsize
+
+    def __len__(self):
+        return self.index["rows"] + self.buffered
+
+    def append(self, game: int, turn: int, board: np.ndarray, move: tuple, score: int, spawned: list, lines: list):
+        """Add a turn, spawned is a list of (y, x, color) and lines a list of cleared lines"""
+        row = self.buffered
+        buffers = self.buffers
+        buffers["game"][row] = game
+        buffers["turn"][row] = turn
+        buffers["board"][row] = board
+        buffers["move"][row] = move
+        buffers["score"][row] = score
+
+        width = self.width
+        self.ragged["spawned"].extend((y * width + x, color) for y, x, color in spawned)
+        self.ragged["lines"].extend(len(line) for line in lines)
+        buffers["spawned_end"][row] = self.ends["spawned"] + len(self.ragged["spawned"])
+        buffers["lines_end"][row] = self.ends["lines"] + len(self.ragged["lines"])
+
+        self.buffered += 1
+        if self.buffered == self.chunk:
+            self.flush()
+
+    def append_turn(self, game: int, board: np.ndarray, start: tuple, end: tuple, engine, spawned: list,
+                    lines: list):
+        """append() a move played on engine, board being a copy of the grid before it"""
+        width = engine.WIDTH
+        move = (-1, -1) if start is None else (start[0] * width + start[1], end[0] * width + end[1])
+        self.append(game, engine.turns, board, move, engine.score, spawned, lines)
+
+    def flush(self):
+        rows = self.buffered
+        if not rows:
+            return
+        for name, buffer in self.buffers.items():
+            self.files[name].write(buffer[:rows].tobytes())
+        for name, dtype in RAGGED.items():
+            values = np.array(self.ragged[name], dtype).reshape((-1,) + self.shapes[name])
+            self.files[name].write(values.tobytes())
+            self.ends[name] += len(values)
+            self.ragged[name].clear()
+        for file in self.files.values():
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.index["rows"] += rows
+        for name in COLUMNS:
+            self.index["columns"][name] = self.index["rows"]
+        self.index["columns"].update(self.ends)
+        self.buffered = 0
+        write_atomic(os.path.join(self.path, INDEX), json.dumps(self.index).encode())
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_index(path: str):
+    try:
+        with open(os.path.join(path, INDEX)) as file:
+            index = json.load(file)
+    except (OSError, ValueError) as e:
+        raise DatasetError(f"Can't read dataset index of {path}: {e}")
+    if index.get("version") != VERSION:
+        raise DatasetError(f"Unsupported dataset version {index.get('version')}")
+    return index
+
+
+class Dataset:
+    """Read-only view of a store written by DatasetWriter.
+
+    columns maps names to memory-mapped arrays, so indexing them reads only the touched
+    pages and stores larger than RAM are fine. Rows appended after opening are not seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = index = read_index(path)
+        self.width, self.height = index["width"], index["height"]
+        self.columns = {}
+        for name, dtype in {**COLUMNS, **RAGGED}.items():
+            shape = (index["columns"][name],) + _row_shape(name, self.width, self.height)
+            if shape[0] == 0:
+                self.columns[name] = np.empty(shape, dtype)
+            else:
+                self.columns[name] = np.memmap(os.path.join(path, name + ".bin"), dtype, "r", shape=shape)
+
+    def __len__(self):
+        return self.index["rows"]
+
+    def ragged(self, name: str, row: int):
+        """Values of a ragged column in a row, a view into the mapped file"""
+        ends = self.columns[name + "_end"]
+        start = int(ends[row - 1]) if row > 0 else 0
+        return self.columns[name][start:int(ends[row])]
+
+    def __getitem__(self, row: int):
+        """A turn as a dict of column name to value, arrays are views"""
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        turn = {name: self.columns[name][row] for name in ("game", "turn", "board", "move", "score")}
+        turn["spawned"] = self.ragged("spawned", row)
+        turn["lines"] = self.ragged("lines", row)
+        return turn
+
+
+def open_datasets(path: str):
+    """Datasets of a store or of a directory holding one store per subdirectory"""
+    if os.path.exists(os.path.join(path, INDEX)):
+        return [Dataset(path)]
+    return [Dataset(os.path.dirname(index)) for index in sorted(glob(os.path.join(path, "*", INDEX)))]
@@ -0,0 +1,310 @@
+from random import Random
+
+import numpy as np
+
+from cell_index import EmptyCellIndex
+from enums import GameStatus
+from history import History, TurnDelta, pack_rng_state, unpack_rng_state
+from instrumentation import Instrumentation
+from lines import EMPTY, extract_lines
+from pathfinding import PathFinder, bits_to_mask
+from reachability import Reachability
+from runs import RunLengths
+from tableContainer import TableContainer
+
+
+class GameEngine:
+    """Qt-free game rules working on an integer color grid.
+
+    Cells hold a color index in range(COLORS_ON_FIELD) or EMPTY.
+    Coordinates are (y, x) tuples, y being the row.
+    All randomness comes from rng, so a game is reproducible from its seed.
+    """
+    WIDTH = 10
+    HEIGHT = 10
+    COLORS_ON_FIELD = 5
+    SPAWN_PER_TURN = 4
+    ITEMS_IN_LINE = 5
+
+    def __init__(self, width: int = 0, height: int = 0, rng: Random = None):
+        self.rng = rng or Random()
+        self.instrumentation = Instrumentation()
+        if width != 0:
+            self.WIDTH = width
+        if height != 0:
+            self.HEIGHT = height
+
+        # grid is the plane of board and only ever changed in place, so the row, column and
+        # diagonal views of board always show the current position
+        self.board = TableContainer(self.HEIGHT, self.WIDTH)
+        self.grid = self.board.plane
+        self.runs = RunLengths(self.board)
+        self.pathfinder = PathFinder(self.HEIGHT, self.WIDTH)
+        self.reachability = Reachability(self.pathfinder)
+        self.reachability.rebuild(self.grid)
+        self.empty_index = EmptyCellIndex(self.grid.size)
+
+        # Colors which are waiting for a position and (y, x, color) of announced spawns
+        self.next_colors = []
+        self.next_positions = []
+
+        self.score = 0
+        self.turns = 0
+        self.status = GameStatus.RUNNING
+
+        self.history = History()
+        # Delta of the turn being played, set_cell adds to it
+        self.recording = None
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+        self.grid.fill(EMPTY)
+        self.load_grid(self.grid)
+        self.next_colors = []
+        self.next_positions = []
+        self.score = 0
+        self.turns = 0
+        self.status = GameStatus.RUNNING
+        self.history.clear()
+
+    def copy(self):
+        """Independent engine in the same position, including the state of its generator"""
+        engine = GameEngine(self.WIDTH, self.HEIGHT, Random())
+        engine.rng.setstate(self.rng.getstate())
+        engine.COLORS_ON_FIELD = self.COLORS_ON_FIELD
+        engine.SPAWN_PER_TURN = self.SPAWN_PER_TURN
+        engine.ITEMS_IN_LINE = self.ITEMS_IN_LINE
+        engine.load_grid(self.grid)
+        engine.empty_index.load(list(self.empty_index))
+        engine.next_colors = list(self.next_colors)
+        engine.next_positions = list(self.next_positions)
+        engine.score = self.score
+        engine.turns = self.turns
+        engine.status = self.status
+        return engine
+
+    def load_grid(self, grid: np.ndarray):
+        """Replace the whole board and rebuild the indexes derived from it"""
+        self.grid[:] = grid
+        self.reachability.rebuild(self.grid)
+        self.empty_index.rebuild(self.grid.ravel() == EMPTY)
+        self.runs.rebuild()
+
+    def set_cell(self, cell: tuple, color: int):
+        """Single entry point for changing the grid, keeps derived indexes up to date"""
+        index = cell[0] * self.WIDTH + cell[1]
+        before = int(self.grid[cell])
+        if self.recording is not None:
+            slot = self.empty_index.slot(index) if before == EMPTY else -1
+            self.recording.cells.append((index, before, color, slot))
+        self.grid[cell] = color
+        if before != EMPTY:
+            self.runs.remove(cell[0], cell[1], before)
+        if color == EMPTY:
+            self.reachability.vacate(index)
+            self.empty_index.add(index)
+        else:
+            self.reachability.occupy(index)
+            self.empty_index.remove(index)
+            self.runs.place(cell[0], cell[1], color)
+
+    @property
+    def empty_count(self):
+        return len(self.empty_index)
+
+    @property
+    def filled_count(self):
+        return self.grid.size - len(self.empty_index)
+
+    def empty_cells(self):
+        return [divmod(i, self.WIDTH) for i in self.empty_index]
+
+    def filled_cells(self):
+        return [tuple(p) for p in np.argwhere(self.grid != EMPTY).tolist()]
+
+    def generate_next_colors(self, n: int = 0):
+        if n == 0:
+            n = self.SPAWN_PER_TURN
+
+        colors = [self.rng.randrange(self.COLORS_ON_FIELD) for _ in range(n)]
+        self.next_colors.extend(colors)
+        return colors
+
+    def place_next_colors(self, n: int = 0):
+        """Choose cells for the next n spawns. Returns list of (y, x, color)."""
+        if n == 0:
+            n = self.SPAWN_PER_TURN
+
+        if len(self.next_colors) < n:
+            self.generate_next_colors(n - len(self.next_colors))
+        try:
+            cells = self.empty_index.sample(n, self.rng)
+        except ValueError:
+            self.status = GameStatus.LOST
+            return []
+
+        placed = []
+        for index in cells:
+            placed.append(divmod(index, self.WIDTH) + (self.next_colors.pop(0),))
+        self.next_positions.extend(placed)
+        return placed
+
+    def spawn(self, n: int = 0):
+        """Put announced balls on the field and announce the next ones.
+
+        Returns (spawned, lines): list of (y, x, color) and list of cleared lines.
+        """
+        with self.instrumentation.phase("spawn"):
+            if n == 0:
+                n = self.SPAWN_PER_TURN
+
+            if len(self.next_positions) < n:
+                self.place_next_colors(n - len(self.next_positions))
+
+            spawned, lines = [], []
+            for _ in range(min(n, len(self.next_positions))):
+                y, x, color = self.next_positions.pop(0)
+                if self.grid[y, x] != EMPTY:
+                    if not self.empty_count:
+                        self.status = GameStatus.LOST
+                        break
+                    y, x = divmod(self.empty_index.choice(self.rng), self.WIDTH)
+
+                self.set_cell((y, x), color)
+                spawned.append((y, x, color))
+                # Lines are cleared as soon as they are made, so a new one has to go through the new ball
+                completed = self.lines_through(y, x)
+                if completed:
+                    self.clear_lines(completed)
+                    lines.extend(completed)
+
+            if self.status == GameStatus.RUNNING:
+                self.place_next_colors()
+            return spawned, lines
+
+    def find_path(self, start: tuple, end: tuple):
+        """Shortest path of (y, x) cells from start to end over empty cells, [] if there is none."""
+        with self.instrumentation.phase("find_path"):
+            width = self.WIDTH
+            start, end = start[0] * width + start[1], end[0] * width + end[1]
+            if not self.reachability.can_reach(start, end):
+                return []
+            return [divmod(i, width) for i in self.pathfinder.find(self.reachability.empty, start, end)]
+
+    def can_move(self, start: tuple, end: tuple):
+        """O(1) check whether the ball at start has a path to the empty end cell"""
+        width = self.WIDTH
+        return self.reachability.can_reach(start[0] * width + start[1], end[0] * width + end[1])
+
+    def reachable_mask(self, start: tuple):
+        """(HEIGHT, WIDTH) bool array of empty cells the ball at start can move to"""
+        bits = self.reachability.reachable_from(start[0] * self.WIDTH + start[1])
+        return bits_to_mask(bits, self.grid.size).reshape(self.grid.shape)
+
+    def completed_lines(self):
+        """Every line of at least ITEMS_IN_LINE same-colored balls, crossing lines included"""
+        with self.instrumentation.phase("line_detection"):
+            return extract_lines(self.grid, self.ITEMS_IN_LINE)
+
+    def lines_through(self, y: int, x: int):
+        """Completed lines passing through (y, x), a lookup of its run lengths"""
+        with self.instrumentation.phase("line_detection"):
+            return self.runs.lines_through(y, x, self.ITEMS_IN_LINE)
+
+    def clear_lines(self, lines: list):
+        """Remove balls of completed lines and return the scores they brought.
+
+        Every line scores its length squared, cells shared by crossing lines count in each of them.
+        """
+        gain = 0
+        for line in lines:
+            for cell in line:
+                if self.grid[cell] != EMPTY:
+                    self.set_cell(cell, EMPTY)
+            gain += len(line) * len(line)
+        self.score += gain
+        return gain
+
+    def relocate(self, start: tuple, end: tuple):
+        self.set_cell(end, self.grid[start])
+        self.set_cell(start, EMPTY)
+
+    def resolve_move(self, end: tuple):
+        """Clear a line made by the ball moved to end or spawn new balls otherwise.
+
+        Returns (spawned, lines) like spawn().
+        """
+        self.turns += 1
+        lines = self.lines_through(*end)
+        if lines:
+            self.clear_lines(lines)
+            return [], lines
+        return self.spawn()
+
+    def apply_move(self, start: tuple, end: tuple):
+        """Play a turn of a move known to be legal and record it in history. Returns (spawned, lines)."""
+        next_positions, next_colors = list(self.next_positions), list(self.next_colors)
+        score, turns, status, rng_state = self.score, self.turns, self.status, pack_rng_state(self.rng.getstate())
+        delta = self.recording = TurnDelta()
+        try:
+            self.relocate(start, end)
+            spawned, lines = self.resolve_move(end)
+        finally:
+            self.recording = None
+
+        delta.next_positions = (next_positions, list(self.next_positions))
+        delta.next_colors = (next_colors, list(self.next_colors))
+        delta.score = (score, self.score)
+        delta.turns = (turns, self.turns)
+        delta.status = (status, self.status)
+        delta.rng_state = rng_state
+        self.history.push(delta)
+        return spawned, lines
+
+    def move(self, start: tuple, end: tuple):
+        """Play a full turn. Returns (path, spawned, lines), path is [] for an illegal move."""
+        if self.grid[start] == EMPTY or not self.can_move(start, end):
+            return [], [], []
+        path = self.find_path(start, end)
+        if not path:
+            return [], [], []
+        spawned, lines = self.apply_move(start, end)
+        return path, spawned, lines
+
+    def undo(self):
+        """Take back the last recorded turn, returns its TurnDelta or None if there is none"""
+        delta = self.history.undo()
+        if delta is not None:
+            self.revert_cells(delta.cells)
+            self._restore_turn(delta, 0)
+        return delta
+
+    def revert_cells(self, cells: list):
+        """Undo changes recorded by set_cell, newest first, empty cells get their order back"""
+        for index, before, after, slot in reversed(cells):
+            self.set_cell(divmod(index, self.WIDTH), before)
+            if before == EMPTY and after != EMPTY:
+                # Picks of empty cells depend on their order, put the cell back where it was
+                self.empty_index.restore(index, slot)
+
+    def redo(self):
+        """Play again the last undone turn, returns its TurnDelta or None if there is none"""
+        delta = self.history.redo()
+        if delta is not None:
+            for index, _, after, _ in delta.cells:
+                self.set_cell(divmod(index, self.WIDTH), after)
+            self._restore_turn(delta, 1)
+        return delta
+
+    def _restore_turn(self, delta: TurnDelta, side: int):
+        """Set what a delta holds besides cells, side 0 being before the turn and 1 after it"""
+        self.next_positions = list(delta.next_positions[side])
+        self.next_colors = list(delta.next_colors[side])
+        self.score = delta.score[side]
+        self.turns = delta.turns[side]
+        self.status = delta.status[side]
+        # The delta holds the generator state of the other side, the one the engine is on goes in its place
+        state = pack_rng_state(self.rng.getstate())
+        self.rng.setstate(unpack_rng_state(delta.rng_state))
+        delta.rng_state = state
@@ -1,9 +1,33 @@
+import argparse
 import sys
+import time
 
-from PyQt5.QtWidgets import *
+from PyQt5.QtWidgets import QApplication
 
-from qt_widgets import MainWindow
+from enums import GameDifficulty
+from qt_widgets import MainWindow, parse_size
 
-app = QApplication(sys.argv)
-window = MainWindow()
+parser = argparse.ArgumentParser(description="Lines game")
+size = parser.add_mutually_exclusive_group()
+size.add_argument("--difficulty", choices=[d.name.lower() for d in GameDifficulty], default="easy",
+                  help="board size preset")
+size.add_argument("--size", type=parse_size, metavar="WIDTHxHEIGHT", help="custom board size")
+parser.add_argument("--seed", type=int, help="seed of the game, random by default")
+parser.add_argument("--record", metavar="FILE", help="log the game for replay.py")
+parser.add_argument("--load", metavar="FILE", help="continue a saved game")
+parser.add_argument("--autosave", metavar="FILE", help="save the game to FILE after every turn")
+parser.add_argument("--instrument", metavar="FILE", help="collect per-turn timings and counters, saved on exit")
+parser.add_argument("--startup-time", action="store_true",
+                    help="print the wall clock time of the first paint of the window and quit")
+args, qt_args = parser.parse_known_args()
+
+app = QApplication(sys.argv[:1] + qt_args)
+window = MainWindow(size=args.size or GameDifficulty[args.difficulty.upper()].value, seed=args.seed,
+                    replay_log=args.record, load=args.load, autosave=args.autosave)
+if args.instrument:
+    instrumentation = window.logic_source.instrumentation
+    instrumentation.enabled = True
+    app.aboutToQuit.connect(lambda: instrumentation.export(args.instrument))
+if args.startup_time:
+    window.first_painted.connect(lambda: (print(repr(time.time()), flush=True), app.quit()))
 app.exec_()
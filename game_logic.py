@@ -1,103 +1,61 @@
-from copy import deepcopy
-from random import sample, choice
+from contextlib import contextmanager
+from random import Random, randrange
 
-import numpy as np
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QPoint, QRect
+from PyQt5.QtCore import QObject, pyqtSignal, QPoint
 from PyQt5.QtGui import QColor
-from enums import CoordinatesMoves
-from tableContainer import NpTableContainer
+from engine import GameEngine
+from lines import EMPTY
+from replay import ReplayWriter
+from savegame import AutoSaver, SaveError, dumps, loads, write_atomic
+from enums import GameStatus
 
 
-class GameItem(QObject):
-    ''' Ball with color and status '''
+class GameItem:
+    """Ball with color"""
+    __slots__ = ("color",)
 
-    def __init__(self, color, cell=None):
-        super(GameItem, self).__init__()
+    def __init__(self, color):
         self.color = color
-        self.cell = cell
-
-    @property
-    def cell(self):
-        return self._cell
-
-    @cell.setter
-    def cell(self, cell):
-        self._cell = cell
-        if cell is None and self._cell:
-            del self.item
-            return
-        if cell:
-            if cell.item != self:
-                cell.item = self
-
-    @cell.deleter
-    def cell(self):
-        self._cell.item = None
-        self._cell = None
 
     def __str__(self):
-        in_cell = "" if not self.cell else f" in cell {self.cell}"
-        return f"{str(self.color).capitalize()} point{in_cell}"
+        return f"{str(self.color).capitalize()} point"
 
     def __repr__(self):
-        return f"GameItem('{self.color}', {self.cell})"
+        return f"GameItem('{self.color}')"
 
 
-class GameCell(QObject):
-    """Contains blueprint of a cell on game field"""
-    changed = pyqtSignal()
-    active_status_changed = pyqtSignal(bool)
-    next_color = pyqtSignal(object)
+class GameCell:
+    """Cell of the game field: its ball, selection and announced next color.
 
-    def __init__(self, parent_field, x: int, y: int, item: GameItem = None):
-        super(GameCell, self).__init__()
-        self.parent_field = parent_field
-        parent_field.field_was_reset.connect(self.reset)
+    Cells hold no state, they read it from the field, so they are made on access and
+    compare by position. The field keeps nothing per cell besides a byte of the engine grid.
+    """
+    __slots__ = ("field", "x", "y", "index")
+
+    def __init__(self, field, x: int, y: int):
+        self.field = field
         self.x = x
         self.y = y
-        self.item = item
-        self.changed.emit()
-        self._active = False
+        self.index = y * field.WIDTH + x
 
     @property
     def item(self):
-        return self._item
-
-    @item.setter
-    def item(self, item):
-        self._item = item
-        if item is None and self._item:
-            del self.item
-            return
-
-        if item and item.cell != self._item:
-            item.cell = self
-        self.changed.emit()
-
-    @item.deleter
-    def item(self):
-        del self._item.cell
-        self._item = None
-
-        self.changed.emit()
+        color = self.field.engine.grid[self.y, self.x]
+        return None if color == EMPTY else self.field.color_items[color]
 
     @property
     def active(self):
-        return self._active
+        return self.field.active_item == self
 
-    @active.setter
-    def active(self, is_active: bool):
-        self._active = is_active
-        self.active_status_changed.emit(is_active)
+    @property
+    def next_color(self):
+        return self.field.next_colors.get(self.index)
 
-    def is_in_full_line(self):
-        pass
+    def __eq__(self, other):
+        return isinstance(other, GameCell) and other.field is self.field and other.index == self.index
 
-    def reset(self):
-        self.item = None
-        self.active = False
-        self.next_color.emit(None)
-        self.changed.emit()
+    def __hash__(self):
+        return self.index
 
     def __str__(self):
         return f"GameCell({self.y},{self.x})"
@@ -106,250 +64,369 @@ class GameCell(QObject):
         return f"GameCell({self.y},{self.x})"
 
 
+class FieldCells:
+    """GameCell of every (y, x) position, made when asked for"""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __len__(self):
+        return self.field.HEIGHT * self.field.WIDTH
+
+    def __getitem__(self, position: tuple):
+        y, x = position
+        if not (0 <= y < self.field.HEIGHT and 0 <= x < self.field.WIDTH):
+            raise IndexError(f"Cell {position} is out of the {self.field.WIDTH}x{self.field.HEIGHT} field")
+        return GameCell(self.field, x, y)
+
+    def __iter__(self):
+        for y in range(self.field.HEIGHT):
+            for x in range(self.field.WIDTH):
+                yield GameCell(self.field, x, y)
+
+
+class FieldDiff:
+    """Everything a transaction changed on the field, delivered at once by GameField.field_changed"""
+    __slots__ = ("cells", "cleared", "next_items", "path", "moved_item")
+
+    def __init__(self):
+        # Flat indices of changed cells, a dict keeps them unique and ordered
+        self.cells = {}
+        # Length of every cleared line
+        self.cleared = []
+        # New list of next balls, None when it did not change
+        self.next_items = None
+        # (y, x) cells a ball went through and the ball, the move is already applied to cells
+        self.path = None
+        self.moved_item = None
+
+    def __bool__(self):
+        return bool(self.cells or self.cleared or self.next_items is not None or self.path)
+
+    def __repr__(self):
+        return f"FieldDiff(cells={list(self.cells)}, cleared={self.cleared}, path={self.path})"
+
+
 class GameField(QObject):
-    """Contains game field and all logic of it"""
-    WIDTH = 10
-    HEIGHT = 10
-    COLORS_ON_FIELD = 5
-    SPAWN_PER_TURN = 4
-    ITEMS_IN_LINE = 5
+    """Qt adapter exposing GameEngine state as cells and signals"""
+    WIDTH = GameEngine.WIDTH
+    HEIGHT = GameEngine.HEIGHT
+    COLORS_ON_FIELD = GameEngine.COLORS_ON_FIELD
+    SPAWN_PER_TURN = GameEngine.SPAWN_PER_TURN
+    ITEMS_IN_LINE = GameEngine.ITEMS_IN_LINE
     MOVE_SPEED_MS = 50
     SHOW_NEXT_COLORS = True
 
     COLORS = ["blueviolet", "brown", "coral", "darkgreen", "darkmagenta", "darkorange", "deeppink", "gold",
               "limegreen", "mediumslateblue", "orangered", "white"]
 
+    # FieldDiff of a committed transaction
+    field_changed = pyqtSignal(object)
     field_was_reset = pyqtSignal()
-    cells_cleared = pyqtSignal(int)
-    item_moved = pyqtSignal()
     loose = pyqtSignal()
-    next_colors_generated = pyqtSignal(list)
     show_next_signal = pyqtSignal(bool)
 
-    def __init__(self, width: int = 0, height: int = 0):
+    def __init__(self, width: int = 0, height: int = 0, seed: int = None):
         super(GameField, self).__init__()
 
-        self.field_colors = sample(self.COLORS, self.COLORS_ON_FIELD)
-        if width != 0:
-            self.WIDTH = width
-        if height != 0:
-            self.HEIGHT = height
+        self.seed = randrange(2 ** 63) if seed is None else seed
+        self.engine = None
+        self.instrumentation = None
+        self.set_engine(GameEngine(width, height, Random(self.seed)))
+
+        self.set_colors()
+        self.replay = None
+        self.autosaver = None
 
-        self.next_items = []
         self.next_items_positions = []
+        # QColor of announced balls by flat cell index
+        self.next_colors = {}
         self.show_next_colors = self.SHOW_NEXT_COLORS
 
-        self.items = NpTableContainer(self.HEIGHT, self.WIDTH)
+        self._diff = None
+        self._depth = 0
+
+        self.items = FieldCells(self)
         self.active_item = None
-        self.create_field_cells()
 
-        self.create_game_items(self.SPAWN_PER_TURN)
+        self.loose.connect(self.reset)
 
-        self.move_timer = QTimer()
+    def set_engine(self, engine: GameEngine, keep_rules: bool = False):
+        """Play on engine from now on, its board size becomes the size of the field.
 
-        self.loose.connect(self.reset)
+        The engine gets the rules of the field, unless keep_rules is set, then the field
+        takes the rules of the engine, as for a loaded game.
+        """
+        if keep_rules:
+            self.COLORS_ON_FIELD = engine.COLORS_ON_FIELD
+            self.SPAWN_PER_TURN = engine.SPAWN_PER_TURN
+            self.ITEMS_IN_LINE = engine.ITEMS_IN_LINE
+        else:
+            engine.COLORS_ON_FIELD = self.COLORS_ON_FIELD
+            engine.SPAWN_PER_TURN = self.SPAWN_PER_TURN
+            engine.ITEMS_IN_LINE = self.ITEMS_IN_LINE
+        if self.instrumentation is not None:
+            engine.instrumentation = self.instrumentation
+        self.engine = engine
+        self.WIDTH = engine.WIDTH
+        self.HEIGHT = engine.HEIGHT
+        self.instrumentation = engine.instrumentation
+
+    def new_game(self, width: int, height: int):
+        """Start a game on a board of another size"""
+        if (width, height) == (self.WIDTH, self.HEIGHT):
+            self.reset()
+            return
+        self._stop_replay()
+        self.set_engine(GameEngine(width, height, self.engine.rng))
+        self.reset()
+
+    def _stop_replay(self):
+        if self.replay:
+            # The log can't tell how the new position came about, so recording stops here
+            self.replay.close()
+            self.replay = None
+
+    def set_colors(self):
+        """Pick the field colors of the game seed"""
+        self.field_colors = Random(self.seed).sample(self.COLORS, self.engine.COLORS_ON_FIELD)
+        # Balls hold nothing but a color, so one instance per color is shared by all cells
+        self.color_items = [GameItem(color) for color in self.field_colors]
+
+    def record(self, file):
+        """Log the game to a binary file, has to be called before the first spawn"""
+        self.replay = ReplayWriter(file, self.engine, self.seed)
+
+    def save_state(self):
+        return dumps(self.engine, self.seed)
+
+    def save(self, path: str):
+        write_atomic(path, self.save_state())
+
+    def load(self, path: str):
+        """Continue a saved game, raises SaveError if the file does not hold one"""
+        with open(path, "rb") as file:
+            data = file.read()
+        self.load_state(data)
+
+    def load_state(self, data: bytes):
+        """Continue the game of data, which may be played on a board of another size"""
+        engine, seed = loads(data)
+        if engine.COLORS_ON_FIELD > len(self.COLORS):
+            raise SaveError(f"Saved game has {engine.COLORS_ON_FIELD} colors, there are only {len(self.COLORS)}")
+        self.seed = seed
+        self._stop_replay()
+        self.set_engine(engine, keep_rules=True)
+        self.set_colors()
+        self.active_item = None
+        self.next_items_positions = []
+        self.next_colors = {}
+        self.instrumentation.emit(self.field_was_reset)
+        with self.transaction():
+            self.notify_all()
+            self.update_next_items()
+
+    def autosave(self, path: str):
+        """Save the game to path on a background thread after every turn"""
+        if self.autosaver:
+            self.autosaver.close()
+        self.autosaver = AutoSaver(path)
+
+    def _autosave(self):
+        if self.autosaver and self.engine.status == GameStatus.RUNNING:
+            self.autosaver.save(self.save_state())
+
+    @property
+    def next_items(self):
+        return [self.color_items[color] for *_, color in self.engine.next_positions]
 
     def toggle_show_next_colors(self):
         self.show_next_colors = not self.show_next_colors
-        self.show_next_signal.emit(self.show_next_colors)
-
-    def create_field_cells(self):
-        for y in range(self.HEIGHT):
-            for x in range(self.WIDTH):
-                self.items[y, x] = GameCell(self, y, x)
-
-    def create_game_items(self, n: int = 0):
-        if n == 0:
-            n = self.SPAWN_PER_TURN
+        self.instrumentation.emit(self.show_next_signal, self.show_next_colors)
+
+    def begin(self):
+        """Start collecting changes, transactions may be nested"""
+        if self._depth == 0:
+            self._diff = FieldDiff()
+        self._depth += 1
+
+    def commit(self):
+        """Deliver changes of the outermost transaction in one field_changed"""
+        self._depth -= 1
+        if self._depth:
+            return
+        diff, self._diff = self._diff, None
+        if diff:
+            self.instrumentation.emit(self.field_changed, diff)
+        if self.engine.status == GameStatus.LOST:
+            self.instrumentation.emit(self.loose)
+
+    @contextmanager
+    def transaction(self):
+        self.begin()
+        try:
+            yield self._diff
+        finally:
+            self.commit()
+
+    def notify_changed(self, cells: list):
+        with self.transaction() as diff:
+            diff.cells.update(dict.fromkeys(cell.index for cell in cells))
+
+    def notify_all(self):
+        with self.transaction() as diff:
+            diff.cells.update(dict.fromkeys(range(self.WIDTH * self.HEIGHT)))
+
+    def set_active(self, cell: GameCell, is_active: bool):
+        if is_active:
+            if self.active_item and self.active_item != cell:
+                self.notify_changed([self.active_item])
+            self.active_item = cell
+        elif self.active_item == cell:
+            self.active_item = None
+        self.notify_changed([cell])
 
-        for _ in range(n):
-            item = GameItem(choice(self.field_colors))
-            self.next_items.append(item)
+    def set_next_color(self, cell: GameCell, color):
+        if color is None:
+            self.next_colors.pop(cell.index, None)
+        else:
+            self.next_colors[cell.index] = color
+        self.notify_changed([cell])
 
-        self.next_colors_generated.emit(self.next_items)
+    def reset_cell(self, cell: GameCell):
+        """Cell got emptied in the engine, drop its selection and announced ball"""
+        if self.active_item == cell:
+            self.active_item = None
+        self.next_colors.pop(cell.index, None)
+        self.notify_changed([cell])
 
     def find_filled_cells(self):
-        cells = np.ravel(self.items)
-        empty_cells = [c for c in cells if c.item is not None]
-        return empty_cells
+        return [self.items[p] for p in self.engine.filled_cells()]
 
     def find_empty_cells(self):
-        cells = np.ravel(self.items)
-        empty_cells = [c for c in cells if c.item is None]
-        return empty_cells
-
-    def create_next_items(self, n: int = 0):
-        if n == 0:
-            n = self.SPAWN_PER_TURN
+        return [self.items[p] for p in self.engine.empty_cells()]
 
-        if len(self.next_items) < n:
-            self.create_game_items(n - len(self.next_items))
-        try:
-            cells = sample(self.find_empty_cells(), n)
-        except ValueError:
-            self.loose.emit()
-            return
-
-        for c in cells:
-            next_color = self.next_items.pop(0)
-            self.next_items_positions.append((c, next_color))
-            c.next_color.emit(QColor(next_color.color))
+    def sync_cell(self, y: int, x: int):
+        """Report a cell the engine changed"""
+        cell = self.items[y, x]
+        if self.engine.grid[y, x] == EMPTY:
+            self.reset_cell(cell)
+        else:
+            self.notify_changed([cell])
+
+    def apply_spawn_result(self, spawned: list, lines: list):
+        if self.replay:
+            self.replay.spawned(spawned)
+        with self.transaction():
+            with self.instrumentation.phase("apply_spawn"):
+                for y, x, _ in spawned:
+                    self.sync_cell(y, x)
+            for line in lines:
+                self.clear_line([self.items[p] for p in line])
+
+            with self.instrumentation.phase("update_next_items"):
+                self.update_next_items()
+
+    def update_next_items(self):
+        with self.transaction() as diff:
+            for cell in self.next_items_positions:
+                self.set_next_color(cell, None)
+            self.next_items_positions = []
+
+            for y, x, color in self.engine.next_positions:
+                cell = self.items[y, x]
+                self.next_items_positions.append(cell)
+                self.set_next_color(cell, QColor(self.field_colors[color]))
+            diff.next_items = self.next_items
 
     def spawn_items(self, n: int = 0):
-        if n == 0:
-            n = self.SPAWN_PER_TURN
-
-        if len(self.next_items_positions) < n:
-            self.create_next_items(n - len(self.next_items_positions))
-
-        for _ in range(n):
-            cell, item = self.next_items_positions.pop(0)
-            cell.next_color.emit(None)
-            if cell.item is not None:
-                cell = choice(self.find_empty_cells())
-
-            cell.item = item
-            line = self.cell_is_in_line(cell)
-            if line:
-                self.clear_line(line)
-        self.create_next_items()
-
-    def move_item(self, path: list, step: int = 0):
-
-        current_cell_point = path[step]
-        current_cell = self.items[current_cell_point.x(), current_cell_point.y()]
+        with self.instrumentation.phase("spawn_items"):
+            self.apply_spawn_result(*self.engine.spawn(n))
+
+    def move_item(self, path: list):
+        """Move the active ball along a path at once, animating it is left to the view"""
+        start = (path[0].y(), path[0].x())
+        end = (path[-1].y(), path[-1].x())
+        start_cell, end_cell = self.items[start], self.items[end]
+
+        if self.replay:
+            self.replay.moved(start, end)
+        with self.instrumentation.phase("move_item"), self.transaction() as diff:
+            self.set_active(start_cell, False)
+            self.active_item = None
+            diff.path = [(p.y(), p.x()) for p in path]
+            diff.moved_item = start_cell.item
 
-        if step < len(path) - 1:
-            next_cell_point = path[step + 1]
-            next_cell = self.items[next_cell_point.x(), next_cell_point.y()]
+            spawned, lines = self.engine.apply_move(start, end)
+            self.notify_changed([start_cell, end_cell])
+            self.apply_spawn_result(spawned, lines)
+        self.instrumentation.end_turn()
+        self._autosave()
 
-            next_cell.item = current_cell.item
-            current_cell.item = None
-            self.item_moved.emit()
-            self.move_timer.singleShot(self.MOVE_SPEED_MS,
-                                       lambda self=self, path=path, step=step: self.move_item(path, step + 1))
+    def undo(self):
+        """Take back the last turn"""
+        self._step_history(self.engine.undo, ReplayWriter.undo)
 
-        else:
-            target_cell_point = path[-1]
-            cell = self.items[target_cell_point.x(), target_cell_point.y()]
+    def redo(self):
+        """Play again the last turn taken back"""
+        self._step_history(self.engine.redo, ReplayWriter.redo)
 
-            self.active_item.active = False
-            self.active_item.item = None
-            self.active_item = None
-
-            line = self.cell_is_in_line(cell)
-            if line:
-                self.clear_line(line)
-            else:
-                self.spawn_items()
+    def _step_history(self, step, record):
+        with self.transaction():
+            if self.active_item:
+                self.set_active(self.active_item, False)
+                self.active_item = None
+            delta = step()
+            if delta is None:
+                return
+            if self.replay:
+                record(self.replay)
+            width = self.WIDTH
+            for index in dict.fromkeys(index for index, *_ in delta.cells):
+                self.sync_cell(*divmod(index, width))
+            self.update_next_items()
+        self._autosave()
 
     def clear_line(self, line):
-        for cell in line:
-            cell.reset()
-            cell.next_color.emit(None)
-        self.cells_cleared.emit(len(line))
-        # self.cells_cleared.emit()
+        with self.instrumentation.phase("clear_line"), self.transaction() as diff:
+            for cell in line:
+                self.reset_cell(cell)
+            diff.cleared.append(len(line))
 
     def reset(self):
-        self.next_items = []
+        if self.replay:
+            self.replay.reset()
+        self.engine.reset()
         self.next_items_positions = []
+        self.next_colors = {}
         self.active_item = None
-        self.field_was_reset.emit()
+        self.instrumentation.emit(self.field_was_reset)
 
-        self.spawn_items()
+        with self.transaction():
+            self.notify_all()
+            self.spawn_items()
+        self._autosave()
 
     def find_path(self, start: GameCell, end: GameCell):
-        field_map = self.items._container
-
-        moves = CoordinatesMoves
-        possible_moves = [moves.RIGHT, moves.DOWN, moves.LEFT, moves.UP]
-        directions = [QPoint(*m.value) for m in possible_moves]
-        field_rect = QRect(0, 0, self.WIDTH, self.HEIGHT)
-
-        start_point = QPoint(start.x, start.y)
-        if end:
-            end_point = QPoint(end.x, end.y)
-        else:
-            end_point = QPoint()
-
-        paths = [[start_point]]
-        last_paths = paths
-        visited_points = set()
-        path_found = False
-        found_path = []
-
-        while not path_found and len(last_paths) > 0:
-            paths.sort(key=lambda x, end=end_point: (x[-1] - end).manhattanLength(), reverse=True)
-            last_paths = []
-            for path in paths:
-                last_point = path[-1]
-                for d in directions:
-                    next_point = last_point + d
-                    if (field_rect.contains(next_point) and
-                            not field_map[next_point.x(), next_point.y()].item and
-                            not str(next_point) in visited_points
-                    ):
-
-                        visited_points.add(str(next_point))
-                        new_path = deepcopy(path + [next_point])
-                        last_paths.append(new_path)
-                        if next_point == end_point:
-                            return new_path
-            else:
-                paths = last_paths
-                pass
-
-            if len(last_paths) == 0 and not path_found:
-                break
-        return found_path
+        path = self.engine.find_path((start.y, start.x), (end.y, end.x))
+        return [QPoint(x, y) for y, x in path]
 
     def cell_is_in_line(self, cell):
-        moves = CoordinatesMoves
-        horizontal_moves = [moves.LEFT, moves.RIGHT]
-        vertical_moves = [moves.UP, moves.DOWN]
-        diagonal1_moves = [moves.UP_LEFT, moves.DOWN_RIGHT]
-        diagonal2_moves = [moves.UP_RIGHT, moves.DOWN_LEFT]
-
-        directions = [horizontal_moves, vertical_moves, diagonal1_moves, diagonal2_moves]
-
-        field_items = self.items
-        pw, ph = self.WIDTH, self.HEIGHT
-        y, x = cell.y, cell.x
-        for direction in directions:
-            line_elements_count = 1
-            line_elements = [cell]
-            for move in direction:
-                next_y, next_x = y, x
-                while True:
-                    next_y, next_x = next_y + move.value[0], next_x + move.value[1]
-                    if 0 <= next_y < ph and 0 <= next_x < pw:
-                        next_cell = field_items[next_x, next_y]
-                        next_item = next_cell.item
-                        if not next_item:
-                            break
-
-                        if cell.item is not None:
-                            if next_item.color == cell.item.color:
-                                line_elements_count += 1
-                                line_elements += [next_cell]
-                                continue
-                            else:
-                                break
-                        else:
-                            break
-                    else:
-                        break
-
-            if line_elements_count >= self.ITEMS_IN_LINE:
-                return line_elements
+        lines = self.engine.lines_through(cell.y, cell.x)
+        if lines:
+            return list({self.items[p]: None for line in lines for p in line})
         return False
 
     def cell_clicked(self, cell):
+        with self.instrumentation.phase("cell_clicked"), self.transaction():
+            self._cell_clicked(cell)
+
+    def _cell_clicked(self, cell):
         if not cell.active and cell.item:
             if self.active_item:
-                self.active_item.active = False
+                self.set_active(self.active_item, False)
                 self.active_item = None
-            cell.active = True
+            self.set_active(cell, True)
             self.active_item = cell
 
         if self.active_item and not cell.item:
@@ -0,0 +1,77 @@
+from time import perf_counter
+
+import numpy as np
+
+from engine import GameEngine
+from pathfinding import bits_to_mask
+
+
+class HintSearch:
+    """Scores every legal move of a position and keeps the best one found in a time budget.
+
+    A move is tried on a private copy of the engine, so lines and paths follow the game rules.
+    The score adds the lines the move completes, the change of the longest line the ball is
+    part of and how much of the empty area stays connected. Moves are tried best guess first,
+    so running out of time still leaves a good move. Candidates are made one ball at a time
+    while searching, so the budget and cancelling hold on boards of any size.
+    """
+    LINE_WEIGHT = 100
+    MOBILITY_WEIGHT = 10
+
+    def __init__(self, engine: GameEngine):
+        self.engine = engine.copy()
+        self.evaluated = 0
+
+    def candidates(self):
+        """Generator of legal moves, most promising first.
+
+        Balls in the longest runs come first, the cells each one can get to are ordered by
+        the longest line the ball would be part of there. Only the moves of the ball being
+        tried are ever built.
+        """
+        engine = self.engine
+        width, size = engine.WIDTH, engine.grid.size
+        lengths = engine.runs.placement_lengths(engine.COLORS_ON_FIELD).reshape(engine.COLORS_ON_FIELD, -1)
+        longest = np.maximum.reduce([runs.plane for runs in engine.runs.runs]).ravel()
+        # Empty cells hold 0 and sort last
+        for start in np.argsort(-longest, kind="stable")[:engine.filled_count].tolist():
+            targets = np.flatnonzero(bits_to_mask(engine.reachability.reachable_from(start), size))
+            color = int(engine.grid.flat[start])
+            targets = targets[np.argsort(-lengths[color, targets], kind="stable")]
+            start = divmod(start, width)
+            for end in targets.tolist():
+                yield start, divmod(end, width)
+
+    def evaluate(self, start: tuple, end: tuple):
+        engine = self.engine
+        before = engine.runs.longest(*start)
+
+        engine.relocate(start, end)
+        try:
+            lines = engine.lines_through(*end)
+            gain = sum(len(line) * len(line) for line in lines)
+            after = engine.runs.longest(*end)
+            if lines:
+                # The line gets cleared, everything around the ball is free again
+                mobility = 1.0
+            else:
+                empty = engine.empty_count
+                largest = max((bits.bit_count() for bits in engine.reachability.components.values()), default=0)
+                mobility = largest / empty if empty else 0.0
+        finally:
+            engine.relocate(end, start)
+        return gain * self.LINE_WEIGHT + after * after - before * before + mobility * self.MOBILITY_WEIGHT
+
+    def search(self, budget: float, cancelled=None):
+        """(start, end) of the best move found within budget seconds, None if no ball can move"""
+        deadline = perf_counter() + budget
+        best, best_score = None, None
+        self.evaluated = 0
+        for start, end in self.candidates():
+            score = self.evaluate(start, end)
+            self.evaluated += 1
+            if best_score is None or score > best_score:
+                best, best_score = (start, end), score
+            if perf_counter() > deadline or (cancelled and cancelled()):
+                break
+        return best
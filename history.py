@@ -0,0 +1,99 @@
+from array import array
+from collections import deque
+
+
+class TurnDelta:
+    """Everything a turn changed: cells, announced balls, score, counters and generator state.
+
+    cells holds (flat index, color before, color after, slot) in the order the changes happened,
+    so a turn is undone and redone in O(changed cells). slot is where the empty cell index kept
+    a cell that got filled, -1 for other changes.
+
+    The generator state is kept once: rng_state is the state before the turn while the turn is
+    played and the state after it once the turn is undone, undo and redo swap it with the
+    state of the engine.
+    """
+    __slots__ = ("cells", "next_positions", "next_colors", "score", "turns", "status", "rng_state")
+
+    def __init__(self):
+        self.cells = []
+        # The rest but rng_state are (before, after) pairs
+        self.next_positions = None
+        self.next_colors = None
+        self.score = None
+        self.turns = None
+        self.status = None
+        self.rng_state = None
+
+    @property
+    def nbytes(self):
+        """Rough memory taken by the delta"""
+        _, words, _ = self.rng_state
+        return 200 + 80 * len(self.cells) + words.itemsize * len(words)
+
+
+def pack_rng_state(state: tuple):
+    """random.Random state as a compact (version, words, gauss) tuple"""
+    version, words, gauss = state
+    return version, array("I", words), gauss
+
+
+def unpack_rng_state(state: tuple):
+    version, words, gauss = state
+    return version, tuple(words), gauss
+
+
+class History:
+    """Bounded undo and redo stacks of TurnDelta.
+
+    The oldest turns are forgotten once the deltas take more than max_bytes or there are
+    more than max_turns of them. Recording a new turn drops the redo stack.
+    """
+
+    def __init__(self, max_turns: int = 1000, max_bytes: int = 4 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def push(self, delta: TurnDelta):
+        for dropped in self.redo_stack:
+            self.nbytes -= dropped.nbytes
+        self.redo_stack.clear()
+        self.undo_stack.append(delta)
+        self.nbytes += delta.nbytes
+        while self.undo_stack and (len(self.undo_stack) > self.max_turns or self.nbytes > self.max_bytes):
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    def undo(self):
+        """Delta to revert or None"""
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self):
+        """Delta to apply again or None"""
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        self.undo_stack.append(delta)
+        return delta
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
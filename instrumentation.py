@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from time import perf_counter
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    """Count, sum, min, max and power-of-two buckets of recorded values"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = Counter()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[int(value).bit_length()] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.min,
+            "max": self.max,
+            # Bucket "n" holds values in [2 ** (n - 1), 2 ** n), "0" holds values below 1
+            "buckets": {str(b): c for b, c in sorted(self.buckets.items())},
+        }
+
+
+class _Phase:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.add((perf_counter() - self.started) * 1e6)
+
+
+class Instrumentation:
+    """Timings of turn phases and per-turn counters, disabled by default.
+
+    Phase durations are recorded in microseconds. Counters are totals, and end_turn() also
+    adds how much each of them grew during the turn to a "<counter>_per_turn" histogram.
+    While disabled every call returns right away.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms = defaultdict(Histogram)
+        self.counters = Counter()
+        self._turn_start = Counter()
+        self.turns = 0
+
+    def phase(self, name: str):
+        """Context manager timing a phase"""
+        if not self.enabled:
+            return _DISABLED
+        return _Phase(self.histograms[name])
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def emit(self, signal, *args):
+        """Emit a Qt signal counting it"""
+        if self.enabled:
+            self.counters["signals"] += 1
+        signal.emit(*args)
+
+    def end_turn(self):
+        if not self.enabled:
+            return
+        for name, value in self.counters.items():
+            self.histograms[name + "_per_turn"].add(value - self._turn_start[name])
+        self._turn_start = Counter(self.counters)
+        self.turns += 1
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self._turn_start.clear()
+        self.turns = 0
+
+    def to_dict(self):
+        return {
+            "turns": self.turns,
+            "counters": dict(self.counters),
+            "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+        }
+
+    def export(self, path: str):
+        import json
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def log(self, level: int = None):
+        # logging and json are only imported when used, they are not needed to play
+        import logging
+        logger = logging.getLogger(__name__)
+        level = logging.INFO if level is None else level
+        for name, histogram in sorted(self.histograms.items()):
+            h = histogram.to_dict()
+            logger.log(level, "%s: count %d, mean %.1f, min %s, max %s", name, h["count"], h["mean"], h["min"], h["max"])
+        logger.log(level, "counters: %s", dict(self.counters))
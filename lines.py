@@ -0,0 +1,108 @@
+import numpy as np
+
+from enums import CoordinatesMoves
+
+EMPTY = -1
+
+# One move per line family: horizontal, vertical and both diagonals
+DIRECTIONS = [CoordinatesMoves.RIGHT.value, CoordinatesMoves.DOWN.value,
+              CoordinatesMoves.DOWN_RIGHT.value, CoordinatesMoves.DOWN_LEFT.value]
+
+
+def _shifted(size: int, step: int, length: int, k: int):
+    """Slice of an axis holding the k-th cell of every window of given length"""
+    if step == 0:
+        return slice(0, size)
+    if step > 0:
+        return slice(k, size - length + 1 + k)
+    return slice(length - 1 - k, size - k)
+
+
+def _offset(a: np.ndarray, dy: int, dx: int):
+    """Array holding a[..., y + dy, x + dx] at (y, x), False where that falls outside"""
+    height, width = a.shape[-2:]
+    out = np.zeros_like(a)
+    if abs(dy) >= height or abs(dx) >= width:
+        return out
+    out[..., max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)] = \
+        a[..., max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return out
+
+
+def line_masks(grid: np.ndarray, length: int, empty: int = EMPTY):
+    """Cells belonging to runs of at least `length` same-colored cells.
+
+    grid is a (..., HEIGHT, WIDTH) color array, so a stack of boards is handled at once.
+    Returns bool array of shape (len(DIRECTIONS), ...grid.shape), one mask per direction.
+    """
+    height, width = grid.shape[-2:]
+    masks = np.zeros((len(DIRECTIONS),) + grid.shape, dtype=bool)
+    if length > max(height, width):
+        return masks
+
+    for d, (dy, dx) in enumerate(DIRECTIONS):
+        if (dy and length > height) or (dx and length > width):
+            continue
+        views = [(Ellipsis, _shifted(height, dy, length, k), _shifted(width, dx, length, k))
+                 for k in range(length)]
+        base = grid[views[0]]
+        windows = base != empty
+        for view in views[1:]:
+            windows &= grid[view] == base
+        for view in views:
+            masks[d][view] |= windows
+    return masks
+
+
+def extract_lines(grid: np.ndarray, length: int, empty: int = EMPTY):
+    """Every completed line of a single board as a list of (y, x) cells.
+
+    Crossing lines are reported separately, so a shared cell appears in each of them.
+    """
+    height, width = grid.shape
+    masks = line_masks(grid, length, empty)
+    lines = []
+    for d, (dy, dx) in enumerate(DIRECTIONS):
+        mask = masks[d]
+        if not mask.any():
+            continue
+        for y, x in np.argwhere(mask).tolist():
+            prev_y, prev_x = y - dy, x - dx
+            if (0 <= prev_y < height and 0 <= prev_x < width and mask[prev_y, prev_x] and
+                    grid[prev_y, prev_x] == grid[y, x]):
+                continue
+
+            line, color = [], grid[y, x]
+            while 0 <= y < height and 0 <= x < width and mask[y, x] and grid[y, x] == color:
+                line.append((y, x))
+                y, x = y + dy, x + dx
+            lines.append(line)
+    return lines
+
+
+def line_scores(grid: np.ndarray, masks: np.ndarray):
+    """Sum of squared line lengths for every board of a (N, HEIGHT, WIDTH) stack.
+
+    masks come from line_masks(). A run of n cells holds n - m + 1 windows of m cells, so
+    n * n equals the count of single cells plus twice the count of windows longer than one cell.
+    """
+    height, width = grid.shape[-2:]
+    scores = np.zeros(grid.shape[:-2], dtype=np.int64)
+    for d, (dy, dx) in enumerate(DIRECTIONS):
+        mask = masks[d]
+        windows = mask.sum(axis=(-2, -1))
+        scores += windows
+        length = 2
+        while windows.any() and length <= max(height, width):
+            if (dy and length > height) or (dx and length > width):
+                break
+            views = [(Ellipsis, _shifted(height, dy, length, k), _shifted(width, dx, length, k))
+                     for k in range(length)]
+            base = grid[views[0]]
+            inside = mask[views[0]].copy()
+            for view in views[1:]:
+                inside &= mask[view] & (grid[view] == base)
+            windows = inside.sum(axis=(-2, -1))
+            scores += 2 * windows
+            length += 1
+    return scores
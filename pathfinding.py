@@ -0,0 +1,121 @@
+from time import perf_counter
+
+import numpy as np
+
+from lines import EMPTY
+
+
+def empty_bits(grid: np.ndarray):
+    """Board occupancy as an int whose bit i is set when flat cell i is empty"""
+    return int.from_bytes(np.packbits(grid.ravel() == EMPTY, bitorder="little").tobytes(), "little")
+
+
+def bits_to_mask(bits: int, size: int):
+    """Flat bool array of length size from a cell bitset"""
+    raw = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder="little")[:size].astype(bool)
+
+
+class PathFinder:
+    """Breadth-first search over flat cell indices of a HEIGHT x WIDTH board.
+
+    The whole frontier is advanced at once with shifts of an int bitset, one bit per cell,
+    and the path is rebuilt only once from the stored frontiers, walking back from the end.
+    Edge masks are built once per board size, neighbours are computed when asked for,
+    so nothing is kept per cell.
+    """
+
+    def __init__(self, height: int, width: int):
+        self.height = height
+        self.width = width
+        size = height * width
+
+        first_column = sum(1 << (y * width) for y in range(height))
+        full = (1 << size) - 1
+        self.not_first_column = full & ~first_column
+        self.not_last_column = full & ~(first_column << (width - 1))
+
+    def neighbours(self, index: int):
+        y, x = divmod(index, self.width)
+        result = []
+        if x + 1 < self.width:
+            result.append(index + 1)
+        if y + 1 < self.height:
+            result.append(index + self.width)
+        if x > 0:
+            result.append(index - 1)
+        if y > 0:
+            result.append(index - self.width)
+        return tuple(result)
+
+    def find(self, empty: int, start: int, end: int):
+        """Shortest path of flat indices from start to end, [] if there is none.
+
+        empty is the occupancy bitset from empty_bits(), start itself does not have to be empty.
+        """
+        target = 1 << end
+        if start == end or not empty & target:
+            return []
+
+        width, not_first, not_last = self.width, self.not_first_column, self.not_last_column
+        frontier = 1 << start
+        unvisited = empty & ~frontier
+        levels = [frontier]
+        while frontier:
+            frontier = (((frontier << 1) & not_first) | ((frontier >> 1) & not_last) |
+                        (frontier << width) | (frontier >> width)) & unvisited
+            if frontier & target:
+                return self._trace_back(levels, end)
+            unvisited ^= frontier
+            levels.append(frontier)
+        return []
+
+    def flood(self, area: int, seed: int, targets: int = 0):
+        """Cells of area connected to the seed bitset.
+
+        Stops early once every cell of targets is reached, so the result is then partial.
+        """
+        width, not_first, not_last = self.width, self.not_first_column, self.not_last_column
+        reached = frontier = seed & area
+        unvisited = area & ~reached
+        while frontier:
+            if targets and not targets & ~reached:
+                break
+            frontier = (((frontier << 1) & not_first) | ((frontier >> 1) & not_last) |
+                        (frontier << width) | (frontier >> width)) & unvisited
+            unvisited ^= frontier
+            reached |= frontier
+        return reached
+
+    def _trace_back(self, levels: list, end: int):
+        path = [end]
+        index = end
+        for level in reversed(levels):
+            for n in self.neighbours(index):
+                if level >> n & 1:
+                    index = n
+                    break
+            path.append(index)
+        path.reverse()
+        return path
+
+
+def benchmark(size: int = 100, fill: float = 0.3, runs: int = 200, seed: int = 0):
+    """Mean and worst search time in seconds for random start/end pairs on a size x size board"""
+    rng = np.random.default_rng(seed)
+    grid = np.where(rng.random((size, size)) < fill, 0, EMPTY).astype(np.int8)
+    empty = np.flatnonzero(grid.ravel() == EMPTY)
+    finder = PathFinder(size, size)
+
+    times = []
+    for start, end in rng.choice(empty, (runs, 2)).tolist():
+        t = perf_counter()
+        finder.find(empty_bits(grid), start, end)
+        times.append(perf_counter() - t)
+    return sum(times) / runs, max(times)
+
+
+if __name__ == "__main__":
+    for fill in (0.0, 0.3, 0.5):
+        mean, worst = benchmark(fill=fill)
+        print(f"100x100, {fill:.0%} filled: mean {mean * 1000:.3f} ms, worst {worst * 1000:.3f} ms")
@@ -1,20 +1,36 @@
-from itertools import chain
+import os
 
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
-from PyQt5.QtWidgets import *
+from PyQt5.QtCore import (QMargins, QMarginsF, QObject, QPoint, QPointF, QRectF, QSize, QSizeF, QThread, QTimer,
+                          Qt, pyqtSignal)
+from PyQt5.QtGui import (QCloseEvent, QColor, QFont, QIcon, QMouseEvent, QPaintEvent, QPainter, QResizeEvent,
+                         QWheelEvent)
+from PyQt5.QtWidgets import (QAction, QActionGroup, QFileDialog, QHBoxLayout, QInputDialog, QLabel, QMainWindow,
+                             QMenuBar, QMessageBox, QPushButton, QSizePolicy, QVBoxLayout, QWidget)
 
+from animation import Animator
+from enums import GameDifficulty
 from game_logic import GameField
+from hints import HintSearch
+from lines import EMPTY
 from resources import Sounds
+from savegame import SaveError
+from sprites import SpriteCache
 
+ICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FILE.ico")
+SAVE_FILTER = "Saved games (*.lines);;All files (*)"
+MIN_BOARD_SIDE = 5
+MAX_BOARD_SIDE = 1000
 
-class Percent:
-    def __init__(self, base_val: int):
-        self._base = base_val
-        self.scaler = base_val * 0.01
 
-    def __call__(self, percents):
-        return percents * self.scaler
+def parse_size(text: str):
+    """(width, height) of a board size written as WIDTHxHEIGHT"""
+    try:
+        width, height = (int(side) for side in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Board size {text!r} is not WIDTHxHEIGHT")
+    if not (MIN_BOARD_SIDE <= width <= MAX_BOARD_SIDE and MIN_BOARD_SIDE <= height <= MAX_BOARD_SIDE):
+        raise ValueError(f"Board sides have to be within {MIN_BOARD_SIDE}..{MAX_BOARD_SIDE}")
+    return width, height
 
 
 class QLabelNumber(QLabel):
@@ -30,57 +46,22 @@ class QLabelNumber(QLabel):
 
 
 class NextColorItemWidget(QPushButton):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, sprites: SpriteCache = None, **kwargs):
         super(NextColorItemWidget, self).__init__(*args, **kwargs)
         self.setFixedSize(30, 30)
 
-        self.gradient = None
-        self.pct = Percent(self.rect().width())
-
-    def construct_gradient(self, color: QColor = QColor("magenta")):
-        gr = QRadialGradient()
-        gr.setCoordinateMode(QGradient.StretchToDeviceMode)
-        c1 = color.lighter(150)
-        c2 = color.darker(450)
-
-        gr.setColorAt(0.05, c1)
-        gr.setColorAt(0.49, color)
-        gr.setColorAt(1.0, c2)
-        gr.setCenter(QPointF(0.7, 0.3))
-
-        gr.setFocalPoint(QPointF(0.7, 0.3))
-        self.gradient = gr
+        self.sprites = sprites if sprites is not None else SpriteCache()
+        self.color = None
 
-    def changed(self):
-        self.construct_gradient(color)
+    def set_color(self, color: QColor = None):
+        self.color = color
         self.update()
 
-    def resizeEvent(self, e: QResizeEvent):
-        super().resizeEvent(e)
-        self.pct = Percent(self.rect().width())
-
     def paintEvent(self, e: QPaintEvent):
-        # super().paintEvent(e)
+        if self.color is None:
+            return
         painter = QPainter(self)
-        painter.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
-        painter.setPen(Qt.NoPen)
-
-        pct = self.pct
-        if self.gradient:
-            rect = QRectF(self.rect()).marginsAdded(QMarginsF() - (pct(10)))
-            shadow_rect = QRectF(rect)
-            shadow_rect.translate(QPoint(pct(-1), pct(1)))
-            shadow_rect.adjust(pct(-2), pct(2), pct(0), pct(2))
-
-            shadow_color = QColor("#000000")
-            shadow_color.setAlpha(100)
-
-            painter.setBrush(shadow_color)
-            painter.drawEllipse(shadow_rect)
-
-            painter.setBrush(self.gradient)
-            painter.drawEllipse(rect)
-
+        painter.drawPixmap(0, 0, self.sprites.get(self.color, self.width(), ratio=self.devicePixelRatioF()))
         painter.end()
 
 
@@ -102,9 +83,10 @@ class NextColorsWidget(QWidget):
 
         layout.addWidget(label)
         layout.addStretch()
+        self.sprites = SpriteCache()
         self.items = []
         for i in range(self.next_colors_len):
-            nc_widget = NextColorItemWidget(self)
+            nc_widget = NextColorItemWidget(self, sprites=self.sprites)
             layout.addWidget(nc_widget)
             self.items.append(nc_widget)
 
@@ -118,14 +100,8 @@ class NextColorsWidget(QWidget):
         self.setVisible(show_next)
 
     def update_next_colors(self, next_colors: list):
-        items_available = len(next_colors)
         for i, item in enumerate(self.items):
-            color = QColor(next_colors[i].color)
-            if i <= items_available:
-                item.construct_gradient(color)
-            else:
-                item.gradient = None
-            item.update()
+            item.set_color(QColor(next_colors[i].color) if i < len(next_colors) else None)
 
     # def paintEvent(self, e: QPaintEvent):
     #     painter = QPainter(self)
@@ -133,217 +109,394 @@ class NextColorsWidget(QWidget):
     #     super(NextColorsWidget, self).paintEvent(e)
 
 
-class FieldItemWidget(QPushButton):
-    changed = pyqtSignal(QObject)
-    leftButtonPressed = pyqtSignal(QObject)
-    rightButtonPressed = pyqtSignal(QObject)
+class HintWorker(QThread):
+    """Runs a HintSearch on a copy of the engine off the GUI thread"""
+    found = pyqtSignal(object)
+
+    def __init__(self, engine, budget: float, *args, **kwargs):
+        super(HintWorker, self).__init__(*args, **kwargs)
+        self.search = HintSearch(engine)
+        self.grid = engine.grid.copy()
+        self.budget = budget
+
+    def run(self):
+        self.found.emit(self.search.search(self.budget, self.isInterruptionRequested))
+
+
+class GameFieldWidget(QWidget):
+    """Board painted by one widget through a viewport which can be zoomed and panned.
+
+    Only cells under the exposed area are painted, straight from the engine grid, so a paint
+    costs what is on screen whatever the size of the board. The wheel zooms around the pointer,
+    dragging with the middle button pans. Cells smaller than DETAIL_CELL_SIZE are drawn as
+    plain squares.
+    """
+    BACKGROUND = QColor("#d1d1d1")
+    BORDER = QColor("#ababab")
+    HINT = QColor("#ffd700")
+    HINT_BUDGET_MS = 300
+    MARGIN = 9
+    ACTIVE_INTERVAL_MS = 300
+    ACTIVE_SIZE_MODIFIER = 0.7
+    PREFERRED_CELL_SIZE = 50
+    PREFERRED_BOARD_SIZE = 500
+    MIN_CELL_SIZE = 2
+    MAX_CELL_SIZE = 120
+    DETAIL_CELL_SIZE = 8
+    ZOOM_STEP = 1.25
+
+    def __init__(self, logic_source, *args, **kwargs):
+        super(GameFieldWidget, self).__init__(*args, **kwargs)
+
+        self.logic_source = logic_source
+        self.sounds = self.parent().sounds
+
+        self.logic_source.field_changed.connect(self.field_changed)
+        self.logic_source.show_next_signal.connect(self.show_next_colors)
 
-    def __init__(self, y, x, *args, **kwargs):
-        super(FieldItemWidget, self).__init__(*args, **kwargs)
-        self._y = y
-        self._x = x
         size_policy = QSizePolicy.Expanding
         policy = QSizePolicy()
         policy.setHorizontalPolicy(size_policy)
         policy.setVerticalPolicy(size_policy)
-        policy.setWidthForHeight(True)
+        policy.setHeightForWidth(True)
         self.setSizePolicy(policy)
+        self.setContentsMargins(*[self.MARGIN] * 4)
+
+        self.rows = logic_source.HEIGHT
+        self.columns = logic_source.WIDTH
+        self.show_next = logic_source.show_next_colors
+
+        # Top left corner of the board in widget pixels and side of a cell, set on resize.
+        # zoom is the unrounded cell size, so small wheel steps add up.
+        self.origin = QPoint()
+        self.cell_size = 0
+        self.zoom = 0.0
+        # The board follows the widget size until it is zoomed
+        self.fitted = True
+        self.pan_from = None
+        self.sprites = SpriteCache()
+        self.logic_source.field_was_reset.connect(self.field_was_reset)
+
+        self.animator = Animator(logic_source.MOVE_SPEED_MS, parent=self)
+        self.animator.frame.connect(self.animation_frame)
+        self.animator.step_passed.connect(self.sounds.tick2.play)
+
+        # Cells of the suggested move
+        self.hint = ()
+        self.hint_worker = None
+
+        self.active_cell = None
+        self.active_timer = QTimer(self)
+        self.active_timer.setInterval(self.ACTIVE_INTERVAL_MS)
+        self.active_timer.timeout.connect(self.toggle_active_state_animation)
+        self.active_size_toggled = False
+        self.self_size_modifier = 1
 
-        self.logic_source = self.parent().logic_source.items[x, y]
-        self.logic_source.changed.connect(self.changed)
-
-        self.logic_source.parent_field.show_next_signal.connect(self.show_next_colors)
-        self.logic_source.active_status_changed.connect(self.toggle_active_state)
+    def sizeHint(self):
+        cell_size = max(self.MIN_CELL_SIZE, min(self.PREFERRED_CELL_SIZE,
+                                                self.PREFERRED_BOARD_SIZE // max(self.columns, self.rows)))
+        return QSize(cell_size * self.columns, cell_size * self.rows)
 
-        self.show_next = self.logic_source.parent_field.show_next_colors
-        self.logic_source.next_color.connect(self.set_next_color)
-        self.next_color = None
+    def minimumSizeHint(self):
+        return QSize(self.sizeHint().width() // 2, self.sizeHint().height() // 2)
 
-        self.gradient = None
-        self.construct_gradient()
+    def hasHeightForWidth(self):
+        return True
 
-        self.active = False
-        self.active_timer = QTimer()
-        self.active_timer.setInterval(300)
-        self.active_timer.timeout.connect(self.toggle_active_state_animation)
+    def heightForWidth(self, width: int):
+        return width * self.rows // self.columns
 
-        self.active_size_toggled = False
-        self.self_size_modifier = 1
+    def resizeEvent(self, e: QResizeEvent):
+        if self.fitted:
+            self.fit()
+        else:
+            self.set_view(self.zoom, self.origin)
 
-    def show_next_colors(self, show_next: bool):
-        self.show_next = show_next
+    def fit(self):
+        """Zoom so the whole board fits the widget"""
+        area = self.contentsRect()
+        self.fitted = True
+        self.set_view(min(area.width() // self.columns, area.height() // self.rows), self.origin)
         self.update()
 
-    def set_next_color(self, next_color):
-        self.next_color = next_color
-        if next_color:
-            self.construct_gradient(next_color)
+    def zoom_by(self, factor: float, anchor: QPoint = None):
+        """Zoom keeping the board point under anchor, the center of the widget by default, in place"""
+        if anchor is None:
+            anchor = self.contentsRect().center()
+        if not self.cell_size:
+            return
+        zoom = min(self.MAX_CELL_SIZE, max(self.MIN_CELL_SIZE, self.zoom * factor))
+        scale = round(zoom) / self.cell_size
+        origin = anchor - (anchor - self.origin) * scale
+        self.fitted = False
+        self.set_view(zoom, origin)
         self.update()
 
-    def toggle_active_state(self, is_active):
-        timer = self.active_timer
-        self.active = is_active
-        if is_active:
-            timer.start()
-            self.nativeParentWidget().sounds.tick2.play()
+    def zoom_in(self):
+        self.zoom_by(self.ZOOM_STEP)
+
+    def zoom_out(self):
+        self.zoom_by(1 / self.ZOOM_STEP)
+
+    def pan(self, dx: int, dy: int):
+        origin = self.origin
+        self.set_view(self.zoom, origin + QPoint(dx, dy))
+        moved = self.origin - origin
+        if moved.x() or moved.y():
+            # Pixels already painted are moved, only the uncovered strips get painted
+            self.scroll(moved.x(), moved.y(), self.contentsRect())
+
+    def set_view(self, zoom: float, origin: QPoint):
+        """Set the zoom and the board origin, keeping the board over the widget. Repainting is up to the caller."""
+        self.zoom = max(self.MIN_CELL_SIZE, zoom)
+        cell_size = round(self.zoom)
+        if cell_size != self.cell_size:
+            self.sprites.discard_size(self.cell_size)
+            self.cell_size = cell_size
+
+        area = self.contentsRect()
+        self.origin = QPoint(self._clamp_axis(origin.x(), area.x(), area.width(), cell_size * self.columns),
+                             self._clamp_axis(origin.y(), area.y(), area.height(), cell_size * self.rows))
+
+    @staticmethod
+    def _clamp_axis(origin: int, start: int, length: int, board: int):
+        # A board smaller than the widget is centered, a larger one can't leave a gap at its sides
+        if board <= length:
+            return start + (length - board) // 2
+        return min(start, max(start + length - board, origin))
+
+    def field_was_reset(self):
+        self.set_hint(())
+        self.animator.skip()
+        self.toggle_active_state(None)
+        self.sprites.retain_colors(self.logic_source.field_colors)
+        if (self.rows, self.columns) != (self.logic_source.HEIGHT, self.logic_source.WIDTH):
+            self.rows, self.columns = self.logic_source.HEIGHT, self.logic_source.WIDTH
+            self.updateGeometry()
+            self.fit()
         else:
-            self.self_size_modifier = 1
-            timer.stop()
+            self.update()
+
+    def cell_rect(self, y: float, x: float):
+        size = self.cell_size
+        return QRectF(self.origin.x() + x * size, self.origin.y() + y * size, size, size)
+
+    def cell_at(self, pos: QPoint):
+        """(y, x) of the cell under a widget position or None"""
+        if not self.cell_size:
+            return None
+        x = (pos.x() - self.origin.x()) // self.cell_size
+        y = (pos.y() - self.origin.y()) // self.cell_size
+        if 0 <= y < self.rows and 0 <= x < self.columns:
+            return y, x
+        return None
+
+    def visible_cells(self, rect: QRectF):
+        """(first_y, last_y, first_x, last_x) of the cells under rect, None if it misses the board"""
+        size = self.cell_size
+        rect = rect.translated(-QPointF(self.origin))
+        first_x, first_y = max(0, int(rect.left() // size)), max(0, int(rect.top() // size))
+        last_x = min(self.columns - 1, int((rect.right() - 1) // size))
+        last_y = min(self.rows - 1, int((rect.bottom() - 1) // size))
+        if first_x > last_x or first_y > last_y:
+            return None
+        return first_y, last_y, first_x, last_x
+
+    def update_cell(self, y: int, x: int):
+        self.update(self.cell_rect(y, x).toAlignedRect())
+
+    def field_changed(self, diff):
+        active = self.logic_source.active_item
+        if active != self.active_cell:
+            self.toggle_active_state(active)
+
+        visible = self.visible_cells(QRectF(self.contentsRect())) if self.cell_size else None
+        if visible is not None:
+            first_y, last_y, first_x, last_x = visible
+            if len(diff.cells) > (last_y - first_y + 1) * (last_x - first_x + 1):
+                self.update()
+            else:
+                columns = self.columns
+                for index in diff.cells:
+                    y, x = divmod(index, columns)
+                    if first_y <= y <= last_y and first_x <= x <= last_x:
+                        self.update_cell(y, x)
+        if diff.path:
+            self.animator.animate(diff.path, diff.moved_item.color)
+        if self.hint and (diff.path or diff.next_items is not None):
+            self.set_hint(())
+        if diff.cleared:
+            self.sounds.line_cleared.play()
+
+    def animation_frame(self, previous: list, animations: list):
+        self.logic_source.instrumentation.count("animation_frames")
+        for y, x in previous:
+            self.update(self.cell_rect(y, x).toAlignedRect())
+        for animation in animations:
+            self.update(self.cell_rect(animation.y, animation.x).toAlignedRect())
+
+    def show_next_colors(self, show_next: bool):
+        self.show_next = show_next
         self.update()
 
+    def request_hint(self):
+        if self.hint_worker is not None and self.hint_worker.isRunning():
+            return
+        worker = self.hint_worker = HintWorker(self.logic_source.engine, self.HINT_BUDGET_MS / 1000, self)
+        worker.found.connect(lambda move: self.hint_found(worker, move))
+        worker.finished.connect(lambda: self.hint_finished(worker))
+        worker.start()
+
+    def stop_hint(self):
+        if self.hint_worker is not None:
+            self.hint_worker.requestInterruption()
+            self.hint_worker.wait()
+
+    def hint_found(self, worker: HintWorker, move):
+        if worker is not self.hint_worker:
+            return
+        # The position may have changed while the search ran
+        grid = self.logic_source.engine.grid
+        if move is not None and worker.grid.shape == grid.shape and (worker.grid == grid).all():
+            self.set_hint(move)
+
+    def hint_finished(self, worker: HintWorker):
+        # The worker holds a copy of the engine, drop it as soon as it is done
+        if worker is self.hint_worker:
+            self.hint_worker = None
+        worker.deleteLater()
+
+    def set_hint(self, cells):
+        for y, x in self.hint + tuple(cells):
+            self.update_cell(y, x)
+        self.hint = tuple(cells)
+
+    def toggle_active_state(self, cell):
+        if self.active_cell is not None:
+            self.update_cell(self.active_cell.y, self.active_cell.x)
+        self.active_cell = cell
+        self.active_size_toggled = False
+        self.self_size_modifier = 1
+        if cell is not None:
+            self.active_timer.start()
+            self.sounds.tick2.play()
+        else:
+            self.active_timer.stop()
+
     def toggle_active_state_animation(self):
         self.active_size_toggled = not self.active_size_toggled
-        if self.active_size_toggled and self.active_timer.isActive():
-            self.self_size_modifier = 0.7
+        if self.active_size_toggled:
+            self.self_size_modifier = self.ACTIVE_SIZE_MODIFIER
         else:
             self.self_size_modifier = 1
-            self.nativeParentWidget().sounds.tick2.play()
-        self.update()
-
-    def construct_gradient(self, color: QColor = QColor("magenta")):
-        gr = QRadialGradient()
-        gr.setCoordinateMode(QGradient.StretchToDeviceMode)
-        c1 = color.lighter(150)
-        c2 = color.darker(450)
-
-        gr.setColorAt(0.05, c1)
-        gr.setColorAt(0.49, color)
-        gr.setColorAt(1.0, c2)
-        gr.setCenter(QPointF(0.7, 0.3))
-
-        gr.setFocalPoint(QPointF(0.7, 0.3))
-        self.gradient = gr
-
-    def changed(self):
-        if self.logic_source.item:
-            self.construct_gradient(QColor(self.logic_source.item.color))
-        elif self.next_color:
-            self.construct_gradient(self.next_color)
-        self.update()
-
-    def resizeEvent(self, e: QResizeEvent):
-        super().resizeEvent(e)
-        self.pct = Percent(self.rect().width())
+            self.sounds.tick2.play()
+        self.update_cell(self.active_cell.y, self.active_cell.x)
 
     def paintEvent(self, e: QPaintEvent):
-        super().paintEvent(e)
+        self.logic_source.instrumentation.count("paint_events")
+        if not self.cell_size:
+            return
+        # When zoomed in the board is larger than the widget, the margins stay clear of it
+        exposed = QRectF(e.rect()).intersected(QRectF(self.contentsRect()))
+        visible = self.visible_cells(exposed)
+        if visible is None:
+            return
 
         painter = QPainter(self)
-        painter.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
-        painter.setPen(Qt.NoPen)
-        pct = self.pct
-        painter.fillRect(self.rect().marginsAdded(QMargins() - 1), QColor("#d1d1d1"))
-        # painter.fillRect(self.rect().marginsAdded(QMargins() - 1), QColor("#d24bcd"))
-
-        if self.next_color and self.logic_source.item is None and self.show_next:
-            rect = QRectF(self.rect()).marginsAdded((QMarginsF() - (pct(30))) / self.self_size_modifier)
-            shadow_rect = QRectF(rect)
-            shadow_rect.translate(QPoint(pct(-1), pct(1)))
-            shadow_rect.adjust(pct(-2), pct(2), pct(0), pct(2))
-
-            shadow_color = QColor("#000000")
-            shadow_color.setAlpha(100)
-
-            painter.setBrush(shadow_color)
-            painter.drawEllipse(shadow_rect)
-
-            painter.setBrush(self.gradient)
-            painter.drawEllipse(rect)
-
-        elif self.logic_source.item is not None:
+        board = QRectF(QPointF(self.origin), QSizeF(self.cell_size * self.columns, self.cell_size * self.rows))
+        painter.setClipRect(exposed.intersected(board))
+        self.paint_board(painter, *visible)
+
+        size = self.cell_size
+        ratio = self.devicePixelRatioF()
+        for animation in self.animator.animations:
+            rect = self.cell_rect(animation.y, animation.x)
+            if rect.intersects(exposed):
+                painter.drawPixmap(rect.topLeft(), self.sprites.get(QColor(animation.color), size, ratio=ratio))
+        painter.end()
 
-            if self.active:
+    def paint_board(self, painter: QPainter, first_y: int, last_y: int, first_x: int, last_x: int):
+        """Paint background, grid, hint, balls and next balls of a block of cells"""
+        size = self.cell_size
+        detail = size >= self.DETAIL_CELL_SIZE
+        top_left = self.cell_rect(first_y, first_x).topLeft()
+        block = QRectF(top_left, QSizeF((last_x - first_x + 1) * size, (last_y - first_y + 1) * size))
+        painter.fillRect(block, self.BACKGROUND)
+        if detail:
+            # Every cell has a one pixel border, so two pixel lines between cells
+            for x in range(first_x, last_x + 2):
+                painter.fillRect(QRectF(self.origin.x() + x * size - 1, block.top(), 2, block.height()), self.BORDER)
+            for y in range(first_y, last_y + 2):
+                painter.fillRect(QRectF(block.left(), self.origin.y() + y * size - 1, block.width(), 2), self.BORDER)
+
+        for y, x in self.hint:
+            if first_y <= y <= last_y and first_x <= x <= last_x:
+                rect = self.cell_rect(y, x)
+                if detail:
+                    painter.fillRect(rect.marginsRemoved(QMarginsF(1, 1, 1, 1)), self.HINT)
+                    painter.fillRect(rect.marginsRemoved(QMarginsF(4, 4, 4, 4)), self.BACKGROUND)
+                else:
+                    painter.fillRect(rect, self.HINT)
+
+        ratio = self.devicePixelRatioF()
+        colors = [QColor(color) for color in self.logic_source.field_colors]
+        # Balls still on their way are drawn over the board instead of at their destination
+        hidden = {animation.end for animation in self.animator.animations}
+        active = self.active_cell
+        grid = self.logic_source.engine.grid[first_y:last_y + 1, first_x:last_x + 1]
+        for y, x in zip(*(grid != EMPTY).nonzero()):
+            y, x = int(y) + first_y, int(x) + first_x
+            if (y, x) in hidden:
+                continue
+            rect = self.cell_rect(y, x)
+            color = colors[grid[y - first_y, x - first_x]]
+            if not detail:
+                painter.fillRect(rect, color)
+                continue
+            modifier = 1
+            if active is not None and (active.y, active.x) == (y, x):
                 active_color = QColor("white")
                 active_color.setAlpha(120)
-                brush = QBrush(active_color)
-                painter.setBrush(brush)
-                painter.drawRect(self.rect().marginsAdded(QMargins() - 2))
-
-            rect = QRectF(self.rect()).marginsAdded((QMarginsF() - (pct(10))) / self.self_size_modifier)
-            shadow_rect = QRectF(rect)
-            shadow_rect.translate(QPoint(pct(-1), pct(1)))
-            shadow_rect.adjust(pct(-2), pct(2), pct(0), pct(2))
-
-            shadow_color = QColor("#000000")
-            shadow_color.setAlpha(100)
-
-            painter.setBrush(shadow_color)
-            painter.drawEllipse(shadow_rect)
-
-            painter.setBrush(self.gradient)
-            painter.drawEllipse(rect)
-
-        painter.end()
-
-    def sizeHint(self):
-        return QSize(50, 50)
-
-    def minimumSizeHint(self):
-        return QSize(self.sizeHint().width() // 2, self.sizeHint().height() // 2)
-
-    def __repr__(self):
-        return f"FieldItemWidget({self._y}, {self._x})"
+                painter.fillRect(rect.marginsRemoved(QMarginsF(2, 2, 2, 2)), active_color)
+                modifier = self.self_size_modifier
+            painter.drawPixmap(rect.topLeft(), self.sprites.get(color, size, modifier, ratio=ratio))
+
+        if detail and self.show_next:
+            columns = self.columns
+            for index, color in self.logic_source.next_colors.items():
+                y, x = divmod(index, columns)
+                if first_y <= y <= last_y and first_x <= x <= last_x and grid[y - first_y, x - first_x] == EMPTY:
+                    painter.drawPixmap(self.cell_rect(y, x).topLeft(), self.sprites.get(color, size, preview=True,
+                                                                                        ratio=ratio))
+
+    def wheelEvent(self, e: QWheelEvent):
+        steps = e.angleDelta().y() / 120
+        if steps:
+            self.zoom_by(self.ZOOM_STEP ** steps, e.pos())
 
     def mousePressEvent(self, e: QMouseEvent):
-        if e.button() == Qt.LeftButton:
-            self.leftButtonPressed.emit(self)
-        elif e.button() == Qt.RightButton:
-            self.rightButtonPressed.emit(self)
-        else:
-            pass
-
-
-class GameFieldWidget(QWidget):
-    def __init__(self, logic_source, *args, **kwargs):
-        super(GameFieldWidget, self).__init__(*args, **kwargs)
-
-        self.logic_source = logic_source
-
-        self.logic_source.item_moved.connect(self.parent().sounds.tick2.play)
-        self.logic_source.cells_cleared.connect(self.parent().sounds.line_cleared.play)
-
-        layout = QGridLayout()
-        self.setLayout(layout)
-        layout.setSpacing(0)
-        layout.heightForWidth(True)
-        self.fieldItems2D = []
-        height, width = logic_source.items._container.shape
-
-        for y in range(height):
-            self.fieldItems2D.append([])
-            for x in range(width):
-                item = FieldItemWidget(y, x, parent=self)
-                self.fieldItems2D[y].append(item)
-                layout.addWidget(item, y, x)
-                item.leftButtonPressed.connect(self.item_clicked)
-                item.rightButtonPressed.connect(self.item_clicked)
-
-        self.fieldItems = list(chain.from_iterable(self.fieldItems2D))
-
-        self.ratio = 1
-        self.adjusted_to_size = (-1, -1)
-
-    def resizeEvent(self, e: QResizeEvent):
-        # https://stackoverflow.com/a/61589941/13537384
-        size = e.size()
-        if size == self.adjusted_to_size:
-            # Avoid infinite recursion. I suspect Qt does this for you,
-            # but it's best to be safe.
+        if e.button() == Qt.MiddleButton:
+            self.pan_from = e.pos()
+            self.setCursor(Qt.ClosedHandCursor)
             return
-        self.adjusted_to_size = size
-
-        full_width = size.width()
-        full_height = size.height()
-        width = min(full_width, full_height * self.ratio)
-        height = min(full_height, full_width / self.ratio)
-
-        h_margin = round((full_width - width) / 2)
-        v_margin = round((full_height - height) / 2)
+        if e.button() not in (Qt.LeftButton, Qt.RightButton):
+            return
+        # A click skips the move animation, the move itself is already done
+        self.animator.skip()
+        cell = self.cell_at(e.pos())
+        if cell is not None:
+            self.logic_source.cell_clicked(self.logic_source.items[cell])
 
-        self.setContentsMargins(h_margin, v_margin, h_margin, v_margin)
+    def mouseMoveEvent(self, e: QMouseEvent):
+        if self.pan_from is not None:
+            delta = e.pos() - self.pan_from
+            self.pan_from = e.pos()
+            self.pan(delta.x(), delta.y())
 
-    def item_clicked(self, item):
-        self.logic_source.cell_clicked(item.logic_source)
+    def mouseReleaseEvent(self, e: QMouseEvent):
+        if e.button() == Qt.MiddleButton and self.pan_from is not None:
+            self.pan_from = None
+            self.unsetCursor()
 
 
 class InformationBar(QWidget):
@@ -366,9 +519,13 @@ class InformationBar(QWidget):
         layout.addWidget(self.next_colors, alignment=Qt.AlignLeft)
         layout.addWidget(self.scores_counter, alignment=Qt.AlignRight)
 
-        self.logic_source.next_colors_generated.connect(self.next_colors.update_next_colors)
+        self.logic_source.field_changed.connect(self.field_changed)
         self.parent().current_scores.connect(self.update_counter)
 
+    def field_changed(self, diff):
+        if diff.next_items is not None:
+            self.next_colors.update_next_colors(diff.next_items)
+
     def reset(self):
         self.scores_counter.display(0)
 
@@ -384,16 +541,114 @@ class GameActions(QObject):
         self.resetAction = QAction("Reset", self)
         self.resetAction.triggered.connect(self.parent().logic_source.reset)
 
+        self.saveAction = QAction("Save...", self)
+        self.saveAction.setShortcut("Ctrl+S")
+        self.saveAction.triggered.connect(self.save_game)
+
+        self.loadAction = QAction("Load...", self)
+        self.loadAction.setShortcut("Ctrl+O")
+        self.loadAction.triggered.connect(self.load_game)
+
+        self.undoAction = QAction("Undo", self)
+        self.undoAction.setShortcut("Ctrl+Z")
+        self.undoAction.triggered.connect(lambda: self.step_history(self.parent().logic_source.undo))
+
+        self.redoAction = QAction("Redo", self)
+        self.redoAction.setShortcut("Ctrl+Y")
+        self.redoAction.triggered.connect(lambda: self.step_history(self.parent().logic_source.redo))
+
+        self.hintAction = QAction("Hint", self)
+        self.hintAction.setShortcut("H")
+        self.hintAction.triggered.connect(self.parent().field_widget.request_hint)
+
         self.toggleSound = QAction("Sound", self)
         self.toggleSound.triggered.connect(self.parent().sounds.toggle_sound)
         self.toggleSound.setCheckable(True)
         self.toggleSound.setChecked(True)
 
+        self.animate_moves = QAction("Animate moves", self)
+        self.animate_moves.setCheckable(True)
+        self.animate_moves.setChecked(not self.parent().field_widget.animator.instant)
+        self.animate_moves.triggered.connect(
+            lambda checked: self.parent().field_widget.animator.set_instant(not checked))
+
         self.show_next_colors = QAction("Next colors", self)
         self.show_next_colors.setCheckable(True)
         self.show_next_colors.setChecked(self.parent().logic_source.show_next_colors)
         self.show_next_colors.triggered.connect(self.parent().logic_source.toggle_show_next_colors)
 
+        self.sizeGroup = QActionGroup(self)
+        self.sizeActions = []
+        for difficulty in GameDifficulty:
+            width, height = difficulty.value
+            action = QAction(f"{difficulty.name.capitalize()} ({width}x{height})", self.sizeGroup)
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, size=difficulty.value: self.new_game(*size))
+            self.sizeActions.append(action)
+        self.customSizeAction = QAction("Custom...", self.sizeGroup)
+        self.customSizeAction.setCheckable(True)
+        self.customSizeAction.triggered.connect(self.custom_game)
+        self.check_size()
+
+        field_widget = self.parent().field_widget
+        self.zoomInAction = QAction("Zoom in", self)
+        self.zoomInAction.setShortcut("Ctrl+=")
+        self.zoomInAction.triggered.connect(field_widget.zoom_in)
+        self.zoomOutAction = QAction("Zoom out", self)
+        self.zoomOutAction.setShortcut("Ctrl+-")
+        self.zoomOutAction.triggered.connect(field_widget.zoom_out)
+        self.fitAction = QAction("Fit board", self)
+        self.fitAction.setShortcut("Ctrl+0")
+        self.fitAction.triggered.connect(field_widget.fit)
+
+        self.parent().logic_source.field_was_reset.connect(self.check_size)
+
+    def check_size(self):
+        """Check the size action of the current board"""
+        logic_source = self.parent().logic_source
+        size = (logic_source.WIDTH, logic_source.HEIGHT)
+        for difficulty, action in zip(GameDifficulty, self.sizeActions):
+            if difficulty.value == size:
+                action.setChecked(True)
+                return
+        self.customSizeAction.setChecked(True)
+
+    def new_game(self, width: int, height: int):
+        self.parent().field_widget.animator.skip()
+        self.parent().logic_source.new_game(width, height)
+
+    def custom_game(self):
+        logic_source = self.parent().logic_source
+        text, ok = QInputDialog.getText(self.parent(), "Custom game", "Board size, WIDTHxHEIGHT:",
+                                        text=f"{logic_source.WIDTH}x{logic_source.HEIGHT}")
+        if ok:
+            try:
+                self.new_game(*parse_size(text))
+            except ValueError as e:
+                QMessageBox.warning(self.parent(), "Custom game", str(e))
+        self.check_size()
+
+    def save_game(self):
+        path, _ = QFileDialog.getSaveFileName(self.parent(), "Save game", "", SAVE_FILTER)
+        if path:
+            try:
+                self.parent().logic_source.save(path)
+            except OSError as e:
+                QMessageBox.warning(self.parent(), "Save game", str(e))
+
+    def load_game(self):
+        path, _ = QFileDialog.getOpenFileName(self.parent(), "Load game", "", SAVE_FILTER)
+        if path:
+            self.parent().field_widget.animator.skip()
+            try:
+                self.parent().logic_source.load(path)
+            except (OSError, SaveError) as e:
+                QMessageBox.warning(self.parent(), "Load game", str(e))
+
+    def step_history(self, step):
+        self.parent().field_widget.animator.skip()
+        step()
+
 
 class GameMenu(QMenuBar):
     def __init__(self, *args, **kwargs):
@@ -402,21 +657,43 @@ class GameMenu(QMenuBar):
         file_menu = self.addMenu("File")
         # file_menu.addAction(self.parent().game_actions.spawnAction)
         file_menu.addAction(self.parent().game_actions.resetAction)
+        file_menu.addAction(self.parent().game_actions.saveAction)
+        file_menu.addAction(self.parent().game_actions.loadAction)
+        file_menu.addAction(self.parent().game_actions.undoAction)
+        file_menu.addAction(self.parent().game_actions.redoAction)
+        file_menu.addAction(self.parent().game_actions.hintAction)
         file_menu.addAction(self.parent().game_actions.show_next_colors)
+        file_menu.addAction(self.parent().game_actions.animate_moves)
         file_menu.addAction(self.parent().game_actions.toggleSound)
 
+        size_menu = self.addMenu("Board")
+        for action in self.parent().game_actions.sizeGroup.actions():
+            size_menu.addAction(action)
+        size_menu.addSeparator()
+        size_menu.addAction(self.parent().game_actions.zoomInAction)
+        size_menu.addAction(self.parent().game_actions.zoomOutAction)
+        size_menu.addAction(self.parent().game_actions.fitAction)
+
 
 class MainWindow(QMainWindow):
     current_scores = pyqtSignal(int)
+    # Emitted once, after the window has been painted for the first time
+    first_painted = pyqtSignal()
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, size: tuple = GameDifficulty.EASY.value, seed: int = None, replay_log: str = None,
+                 load: str = None, autosave: str = None, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
         self.setWindowTitle("Lines")
-        self.setWindowIcon(QIcon("FILE.ico"))
+        self.setWindowIcon(QIcon(ICON))
+        # Sounds are loaded once the window is on screen
         self.sounds = Sounds()
+        self.painted = False
+        self.first_painted.connect(self.sounds.load)
         # self.menuBar().show()
 
-        self.logic_source = GameField(10, 10)
+        self.logic_source = GameField(*size, seed=seed)
+        if replay_log:
+            self.logic_source.record(open(replay_log, "wb", buffering=0))
 
         self.mainWidget = QWidget(self)
         self.setCentralWidget(self.mainWidget)
@@ -427,7 +704,8 @@ class MainWindow(QMainWindow):
         self.status_bar = InformationBar(logic_source=self.logic_source, parent=self)
         layout.addWidget(self.status_bar)
 
-        layout.addWidget(GameFieldWidget(logic_source=self.logic_source, parent=self))
+        self.field_widget = GameFieldWidget(logic_source=self.logic_source, parent=self)
+        layout.addWidget(self.field_widget)
 
         self.scores = 0
 
@@ -436,7 +714,7 @@ class MainWindow(QMainWindow):
         self.menu = GameMenu(self)
         self.setMenuBar(self.menu)
 
-        self.logic_source.cells_cleared.connect(self.add_scores)
+        self.logic_source.field_changed.connect(self.update_scores)
         self.logic_source.field_was_reset.connect(self.reset_scores)
 
         size_policy = QSizePolicy.Minimum
@@ -445,7 +723,12 @@ class MainWindow(QMainWindow):
         policy.setVerticalPolicy(size_policy)
         # policy.setWidthForHeight(True)
         self.setSizePolicy(policy)
-        self.logic_source.spawn_items()
+        if load:
+            self.logic_source.load(load)
+        else:
+            self.logic_source.spawn_items()
+        if autosave:
+            self.logic_source.autosave(autosave)
         self.show()
 
     def reset_scores(self):
@@ -453,12 +736,24 @@ class MainWindow(QMainWindow):
         self.current_scores.emit(self.scores)
         self.sounds.restart.play()
 
-    def add_scores(self, cells_cleared):
-        self.scores += cells_cleared * cells_cleared
-        self.current_scores.emit(self.scores)
+    def update_scores(self, diff):
+        # The engine keeps the score, undo takes points back
+        if self.logic_source.engine.score != self.scores:
+            self.scores = self.logic_source.engine.score
+            self.current_scores.emit(self.scores)
+
+    def closeEvent(self, e: QCloseEvent):
+        self.field_widget.stop_hint()
+        if self.logic_source.autosaver:
+            self.logic_source.autosaver.close()
+        super(MainWindow, self).closeEvent(e)
 
     def paintEvent(self, e: QPaintEvent) -> None:
         super(MainWindow, self).paintEvent(e)
         painter = QPainter(self)
         painter.fillRect(self.rect(), QColor("black"))
         painter.end()
+        if not self.painted:
+            self.painted = True
+            # Children are painted right after the window, let them finish first
+            QTimer.singleShot(0, self.first_painted.emit)
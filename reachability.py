@@ -0,0 +1,109 @@
+import numpy as np
+
+from pathfinding import PathFinder, empty_bits, bits_to_mask
+
+FILLED = -1
+
+
+class Reachability:
+    """Connected components of empty cells, kept up to date as cells get occupied and vacated.
+
+    Every empty cell carries the label of its component in labels, filled cells carry FILLED.
+    Components are stored as cell bitsets like the ones PathFinder works with.
+    """
+
+    def __init__(self, pathfinder: PathFinder):
+        self.pathfinder = pathfinder
+        self.size = pathfinder.height * pathfinder.width
+        self.labels = np.full(self.size, FILLED, dtype=np.int32)
+        self.components = {}
+        self.empty = 0
+        self._next_label = 0
+
+    def rebuild(self, grid: np.ndarray):
+        """Label all components of the grid from scratch"""
+        self.labels.fill(FILLED)
+        self.components = {}
+        self.empty = remaining = empty_bits(grid)
+        while remaining:
+            component = self.pathfinder.flood(remaining, remaining & -remaining)
+            remaining ^= component
+            self._add_component(component)
+
+    def _add_component(self, bits: int):
+        label = self._next_label
+        self._next_label += 1
+        self.components[label] = bits
+        self.labels[bits_to_mask(bits, self.size)] = label
+        return label
+
+    def occupy(self, index: int):
+        """Cell became filled, its component may fall apart"""
+        bit = 1 << index
+        if not self.empty & bit:
+            return
+        self.empty ^= bit
+        label = int(self.labels[index])
+        self.labels[index] = FILLED
+        rest = self.components.pop(label) ^ bit
+
+        # If one flood reaches every remaining neighbour, the rest of the component stays connected
+        seeds = [1 << n for n in self.pathfinder.neighbours(index) if rest >> n & 1]
+        parts = []
+        while seeds:
+            seed = seeds.pop()
+            targets = sum(seeds)
+            reached = self.pathfinder.flood(rest, seed, targets)
+            if reached & targets == targets:
+                parts.append(rest)
+                break
+            parts.append(reached)
+            rest ^= reached
+            seeds = [s for s in seeds if not reached & s]
+
+        if not parts:
+            return
+        parts.sort(key=int.bit_count)
+        self.components[label] = parts.pop()
+        for part in parts:
+            self._add_component(part)
+
+    def vacate(self, index: int):
+        """Cell became empty, it joins the components around it together"""
+        bit = 1 << index
+        if self.empty & bit:
+            return
+        self.empty |= bit
+
+        labels = {int(self.labels[n]) for n in self.pathfinder.neighbours(index)} - {FILLED}
+        if not labels:
+            self.labels[index] = self._add_component(bit)
+            return
+
+        survivor = max(labels, key=lambda label: self.components[label].bit_count())
+        merged = bit
+        for label in labels - {survivor}:
+            bits = self.components.pop(label)
+            merged |= bits
+            self.labels[bits_to_mask(bits, self.size)] = survivor
+        self.components[survivor] |= merged
+        self.labels[index] = survivor
+
+    def can_reach(self, start: int, end: int):
+        """Whether a ball at start (or start itself if it is empty) can get to the empty end cell"""
+        label = self.labels[end]
+        if label == FILLED or start == end:
+            return False
+        if self.labels[start] == label:
+            return True
+        return any(self.labels[n] == label for n in self.pathfinder.neighbours(start))
+
+    def reachable_from(self, start: int):
+        """Bitset of empty cells a ball at start can get to"""
+        labels = {int(self.labels[n]) for n in self.pathfinder.neighbours(start)}
+        labels.add(int(self.labels[start]))
+        labels.discard(FILLED)
+        bits = 0
+        for label in labels:
+            bits |= self.components[label]
+        return bits & ~(1 << start)
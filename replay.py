@@ -0,0 +1,163 @@
+import argparse
+import struct
+from random import Random
+from time import perf_counter
+
+from engine import GameEngine
+
+MAGIC = b"LNRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHBBBQ")
+
+MOVE = b"M"
+SPAWN = b"S"
+RESET = b"R"
+UNDO = b"U"
+REDO = b"D"
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def cell_format(width: int, height: int):
+    """struct format of a flat cell index on a width x height board"""
+    return "H" if width * height <= 0xFFFF else "I"
+
+
+class ReplayWriter:
+    """Append-only binary log of a seeded game.
+
+    The header stores board size, rules and seed, then every record is a one byte tag:
+    MOVE with start and end flat cell indices, SPAWN with a cell index and a color,
+    RESET when a new game starts with the generator state carried over, UNDO and REDO
+    when a turn is taken back or played again.
+    Spawns are not needed to replay a game, they let the replayer detect a diverged run.
+    """
+
+    def __init__(self, file, engine: GameEngine, seed: int):
+        self.file = file
+        self.width = engine.WIDTH
+        cell = cell_format(engine.WIDTH, engine.HEIGHT)
+        self.move_record = struct.Struct("<c" + cell * 2)
+        self.spawn_record = struct.Struct("<c" + cell + "B")
+        self.file.write(HEADER.pack(MAGIC, VERSION, engine.WIDTH, engine.HEIGHT, engine.COLORS_ON_FIELD,
+                                    engine.SPAWN_PER_TURN, engine.ITEMS_IN_LINE, seed))
+
+    def moved(self, start: tuple, end: tuple):
+        width = self.width
+        self.file.write(self.move_record.pack(MOVE, start[0] * width + start[1], end[0] * width + end[1]))
+
+    def spawned(self, spawned: list):
+        width = self.width
+        for y, x, color in spawned:
+            self.file.write(self.spawn_record.pack(SPAWN, y * width + x, color))
+
+    def reset(self):
+        self.file.write(RESET)
+
+    def undo(self):
+        self.file.write(UNDO)
+
+    def redo(self):
+        self.file.write(REDO)
+
+    def close(self):
+        self.file.close()
+
+
+def read_replay(file):
+    """Header dict and a generator of (tag, values) records of a replay log"""
+    header = file.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ReplayError("Replay log is truncated")
+    magic, version, width, height, colors, spawn, in_line, seed = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ReplayError("Not a replay log")
+    if version != VERSION:
+        raise ReplayError(f"Unsupported replay log version {version}")
+
+    cell = cell_format(width, height)
+    records = {MOVE: struct.Struct("<" + cell * 2), SPAWN: struct.Struct("<" + cell + "B"), RESET: struct.Struct(""),
+               UNDO: struct.Struct(""), REDO: struct.Struct("")}
+
+    def iter_records():
+        while True:
+            tag = file.read(1)
+            if not tag:
+                return
+            if tag not in records:
+                raise ReplayError(f"Unknown record {tag!r}")
+            record = records[tag]
+            data = file.read(record.size)
+            if len(data) < record.size:
+                return
+            yield tag, record.unpack(data)
+
+    return {"width": width, "height": height, "colors": colors, "spawn": spawn, "in_line": in_line,
+            "seed": seed}, iter_records()
+
+
+def replay(file, engine: GameEngine = None):
+    """Play a logged game headless at full speed and return the engine in its final state.
+
+    Every game of the log starts with a spawn. Raises ReplayError if the engine spawns
+    differently than the logged game did.
+    """
+    header, records = read_replay(file)
+    if engine is None:
+        engine = GameEngine(header["width"], header["height"])
+    engine.COLORS_ON_FIELD = header["colors"]
+    engine.SPAWN_PER_TURN = header["spawn"]
+    engine.ITEMS_IN_LINE = header["in_line"]
+    engine.rng = Random()
+    engine.reset(header["seed"])
+    pending, _ = engine.spawn()
+
+    width = header["width"]
+    for tag, values in records:
+        if tag == SPAWN:
+            index, color = values
+            logged = divmod(index, width) + (color,)
+            if not pending or pending.pop(0) != logged:
+                raise ReplayError(f"Replay diverged at turn {engine.turns}: logged spawn {logged}")
+            continue
+
+        if pending:
+            raise ReplayError(f"Replay diverged at turn {engine.turns}: spawn {pending} is not logged")
+        if tag == RESET:
+            engine.reset()
+            pending, _ = engine.spawn()
+        elif tag == UNDO:
+            engine.undo()
+        elif tag == REDO:
+            engine.redo()
+        else:
+            start, end = (divmod(i, width) for i in values)
+            path, pending, _ = engine.move(start, end)
+            if not path:
+                raise ReplayError(f"Illegal move {start} -> {end} at turn {engine.turns}")
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a logged Lines game without a display")
+    parser.add_argument("log", help="replay log written by a recorded game")
+    parser.add_argument("--profile", action="store_true", help="run the replay under cProfile")
+    args = parser.parse_args()
+
+    with open(args.log, "rb") as file:
+        started = perf_counter()
+        if args.profile:
+            import cProfile
+            import pstats
+            profiler = cProfile.Profile()
+            engine = profiler.runcall(replay, file)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+        else:
+            engine = replay(file)
+    print(f"{engine.turns} turns, score {engine.score} in {perf_counter() - started:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,75 @@
-from PyQt5.QtCore import QObject
-from PyQt5.QtMultimedia import QSound
+import os
+from time import perf_counter
+
+from PyQt5.QtCore import QObject, QUrl
+
+WAV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wav")
 
 
 class Sounds(QObject):
+    """Game sounds, nothing is loaded before load() or the first play"""
+
     def __init__(self, audio_on=True, *args, **kwargs):
         super(Sounds, self).__init__(*args, **kwargs)
         self.audio_on = audio_on
-        self.tick = GameSound("./wav//tick.wav", self)
-        self.tick2 = GameSound("./wav//tick2.wav", self)
-        self.line_cleared = GameSound("./wav//line_cleared.wav", self)
-        self.restart = GameSound("./wav//restart.wav", self)
+        self.tick = GameSound("tick.wav", self)
+        self.tick2 = GameSound("tick2.wav", self, voices=2, min_interval_ms=40)
+        self.line_cleared = GameSound("line_cleared.wav", self)
+        self.restart = GameSound("restart.wav", self)
 
-    def play(self):
-        if self.parent.audio_on:
-            super(Sounds, self).play()
+    def load(self):
+        for sound in (self.tick, self.tick2, self.line_cleared, self.restart):
+            sound.load()
 
     def toggle_sound(self, toggle: bool):
         self.audio_on = toggle
 
 
-class GameSound(QSound):
-    def __init__(self, filename, parent):
-        super(GameSound, self).__init__(filename)
-        self.parent = parent
+class GameSound(QObject):
+    """Sound effect decoded once and played from memory.
+
+    Up to `voices` copies play at the same time, further plays are dropped, and so is
+    a play coming sooner than min_interval_ms after the previous one. QSoundEffect
+    loads and plays asynchronously, so the GUI thread never waits for audio.
+    """
+
+    def __init__(self, filename: str, parent: Sounds, voices: int = 1, min_interval_ms: int = 0):
+        super(GameSound, self).__init__(parent)
+        self.sounds = parent
+        self.path = os.path.join(WAV_DIR, filename)
+        self.voice_count = voices
+        self.min_interval = min_interval_ms / 1000
+        self.last_played = float("-inf")
+        # Created by load()
+        self.voices = None
+
+    def load(self):
+        if self.voices is not None:
+            return
+        self.voices = []
+        try:
+            # QtMultimedia takes a while to load and may be missing, the game does not need it to start
+            from PyQt5.QtMultimedia import QSoundEffect
+        except ImportError:
+            self.sounds.audio_on = False
+            return
+
+        source = QUrl.fromLocalFile(self.path)
+        for _ in range(self.voice_count):
+            effect = QSoundEffect(self)
+            effect.setSource(source)
+            self.voices.append(effect)
 
     def play(self):
-        if self.parent.audio_on:
-            super(GameSound, self).play()
+        if not self.sounds.audio_on:
+            return
+        if self.voices is None:
+            self.load()
+        now = perf_counter()
+        if now - self.last_played < self.min_interval:
+            return
+        for effect in self.voices:
+            if effect.status() == effect.Ready and not effect.isPlaying():
+                self.last_played = now
+                effect.play()
+                return
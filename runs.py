@@ -0,0 +1,126 @@
+from collections import Counter
+
+import numpy as np
+
+from lines import DIRECTIONS, EMPTY, _offset
+from tableContainer import TableContainer
+
+
+def _squared(length: int):
+    return length * length if length >= 2 else 0
+
+
+class RunLengths:
+    """Length of the same-colored run every ball is part of, in each of the DIRECTIONS.
+
+    Placing or removing a ball only rewrites the runs through its cell, so whether a ball
+    is in a line of some length is a constant time lookup. Empty cells hold 0.
+    potential[color] is the sum of squared lengths of the runs of two or more balls of
+    the color, what line_scores() gives for masks of length 2, kept up to date the same way.
+    """
+
+    def __init__(self, board: TableContainer):
+        self.board = board
+        self.runs = [TableContainer(board.height, board.width, np.int16, 0) for _ in DIRECTIONS]
+        self.potential = Counter()
+        self.rebuild()
+
+    def rebuild(self):
+        """Compute all runs from the board"""
+        self.potential = Counter()
+        for runs in self.runs:
+            runs.plane.fill(0)
+        for direction, name in enumerate(("rows", "columns", "diagonals", "anti_diagonals")):
+            for line, run_line in zip(getattr(self.board, name), getattr(self.runs[direction], name)):
+                # Starts of runs are where the color changes
+                starts = np.flatnonzero(np.diff(line, prepend=EMPTY - 1))
+                lengths = np.diff(starts, append=len(line))
+                colors = line[starts]
+                filled = colors != EMPTY
+                run_line[:] = np.repeat(np.where(filled, lengths, 0), lengths)
+                for color, length in zip(colors[filled].tolist(), lengths[filled].tolist()):
+                    self.potential[color] += _squared(length)
+
+    def place(self, y: int, x: int, color: int):
+        """A ball of color was put on the empty cell (y, x), the board already holds it"""
+        for direction, runs in enumerate(self.runs):
+            line, i = self.board.line(direction, y, x)
+            run_line, _ = runs.line(direction, y, x)
+            before = int(run_line[i - 1]) if i > 0 and line[i - 1] == color else 0
+            after = int(run_line[i + 1]) if i + 1 < len(line) and line[i + 1] == color else 0
+            length = before + 1 + after
+            run_line[i - before:i + after + 1] = length
+            self.potential[color] += _squared(length) - _squared(before) - _squared(after)
+
+    def remove(self, y: int, x: int, color: int):
+        """The ball of color left (y, x), the board no longer holds it there"""
+        for direction, runs in enumerate(self.runs):
+            line, i = self.board.line(direction, y, x)
+            run_line, _ = runs.line(direction, y, x)
+            length = int(run_line[i])
+            before = 0
+            while before < min(i, length - 1) and line[i - before - 1] == color:
+                before += 1
+            after = length - 1 - before
+            run_line[i - before:i] = before
+            run_line[i + 1:i + after + 1] = after
+            run_line[i] = 0
+            self.potential[color] -= _squared(length) - _squared(before) - _squared(after)
+
+    def longest(self, y: int, x: int):
+        """Longest run through (y, x) in any direction, 0 for an empty cell"""
+        return max(int(runs.plane[y, x]) for runs in self.runs)
+
+    def lines_through(self, y: int, x: int, length: int):
+        """Runs of at least length balls through (y, x) as lists of (y, x) cells, in DIRECTIONS order"""
+        lines = []
+        for direction, runs in enumerate(self.runs):
+            run = int(runs.plane[y, x])
+            if run < length:
+                continue
+            line, i = self.board.line(direction, y, x)
+            color = line[i]
+            start = i
+            while start > 0 and line[start - 1] == color:
+                start -= 1
+            dy, dx = DIRECTIONS[direction]
+            lines.append([(y + dy * k, x + dx * k) for k in range(start - i, start - i + run)])
+        return lines
+
+    def placement_length(self, y: int, x: int, color: int, ignore: tuple = None):
+        """Longest line a ball of color put on the empty cell (y, x) would be part of.
+
+        The cell ignore, the one a moving ball leaves, counts as empty.
+        """
+        board = self.board
+        grid = board.plane
+        best = 1
+        for (dy, dx), runs in zip(DIRECTIONS, self.runs):
+            length = 1
+            for step_y, step_x in ((dy, dx), (-dy, -dx)):
+                next_y, next_x = y + step_y, x + step_x
+                if not (0 <= next_y < board.height and 0 <= next_x < board.width and grid[next_y, next_x] == color):
+                    continue
+                # (y, x) is empty, so the run of the neighbour leads away from it
+                side = int(runs.plane[next_y, next_x])
+                if ignore is not None:
+                    k = (ignore[0] - next_y) * step_y if step_y else (ignore[1] - next_x) * step_x
+                    if 0 <= k < side and ignore == (next_y + step_y * k, next_x + step_x * k):
+                        side = k
+                length += side
+            best = max(best, length)
+        return best
+
+    def placement_lengths(self, colors: int):
+        """Length of the longest line a ball of every color put on every cell would be part of.
+
+        Returns int array of shape (colors, HEIGHT, WIDTH), for empty cells the same as
+        placement_length() for every color, computed from the runs next to every cell.
+        """
+        grid = self.board.plane
+        same = grid[None] == np.arange(colors)[:, None, None]
+        best = np.ones(same.shape, dtype=np.int32)
+        for (dy, dx), runs in zip(DIRECTIONS, self.runs):
+            neighbours = np.where(same, runs.plane[None], 0).astype(np.int32)
+            np.maximum(best, 1 + _offset(neighbours, -dy, -dx) + _offset(neighbours, dy, dx), out=best)
+        return best
@@ -0,0 +1,169 @@
+import os
+import struct
+import threading
+from random import Random
+
+import numpy as np
+
+from engine import GameEngine
+from enums import GameStatus
+from lines import EMPTY
+from replay import cell_format
+
+MAGIC = b"LNSV"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHBBBQQIBHH")
+RNG_STATE = struct.Struct("<B625I?d")
+
+
+class SaveError(ValueError):
+    pass
+
+
+def dumps(engine: GameEngine, seed: int):
+    """Game state as bytes.
+
+    The header holds board size, rules, the seed the field colors come from, score, turns,
+    status and the lengths of the color queue and of the announced balls. Then come the
+    grid with one byte per cell, the empty cells in the order random picks see them, the queued
+    colors, the announced balls as a cell index and a color each, and the generator state.
+    """
+    height, width = engine.grid.shape
+    cell = cell_format(width, height)
+    version, words, gauss = engine.rng.getstate()
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, width, height, engine.COLORS_ON_FIELD, engine.SPAWN_PER_TURN,
+                    engine.ITEMS_IN_LINE, seed, engine.score, engine.turns, engine.status.value,
+                    len(engine.next_colors), len(engine.next_positions)),
+        engine.grid.astype(np.int8).tobytes(),
+        struct.pack(f"<{len(engine.empty_index)}{cell}", *engine.empty_index),
+        bytes(engine.next_colors),
+        b"".join(struct.pack("<" + cell + "B", y * width + x, color) for y, x, color in engine.next_positions),
+        RNG_STATE.pack(version, *words, gauss is not None, gauss or 0.0),
+    ])
+
+
+def loads(data: bytes, engine: GameEngine = None):
+    """Restore a state written by dumps() into engine, or a new one. Returns (engine, seed).
+
+    Every field is checked before engine is touched, bad data raises SaveError.
+    """
+    if len(data) < HEADER.size:
+        raise SaveError("Saved game is truncated")
+    (magic, version, width, height, colors, spawn, in_line, seed, score, turns, status,
+     queued, announced) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveError("Not a saved game")
+    if version != VERSION:
+        raise SaveError(f"Unsupported saved game version {version}")
+    if not (width and height and colors and spawn and in_line):
+        raise SaveError("Saved game is corrupted")
+    try:
+        status = GameStatus(status)
+    except ValueError:
+        raise SaveError(f"Saved game has unknown status {status}")
+
+    cell = struct.Struct("<" + cell_format(width, height) + "B")
+    size = width * height
+    if len(data) < HEADER.size + size:
+        raise SaveError("Saved game is truncated")
+    grid = np.frombuffer(data, np.int8, size, HEADER.size).reshape(height, width)
+    if ((grid < EMPTY) | (grid >= colors)).any():
+        raise SaveError("Saved game has balls of unknown colors")
+    empty = struct.Struct(f"<{np.count_nonzero(grid == EMPTY)}{cell_format(width, height)}")
+    if len(data) != HEADER.size + size + empty.size + queued + announced * cell.size + RNG_STATE.size:
+        raise SaveError("Saved game is truncated")
+    order = empty.unpack_from(data, HEADER.size + size)
+    if sorted(order) != np.flatnonzero(grid == EMPTY).tolist():
+        raise SaveError("Saved game is corrupted")
+
+    offset = HEADER.size + size + empty.size
+    next_colors = list(data[offset:offset + queued])
+    offset += queued
+    next_positions = []
+    for _ in range(announced):
+        index, color = cell.unpack_from(data, offset)
+        if index >= size:
+            raise SaveError("Saved game announces a ball outside the board")
+        next_positions.append(divmod(index, width) + (color,))
+        offset += cell.size
+    if any(color >= colors for color in next_colors + [color for _, _, color in next_positions]):
+        raise SaveError("Saved game has balls of unknown colors")
+
+    rng_version, *words, has_gauss, gauss = RNG_STATE.unpack_from(data, offset)
+    rng_state = (rng_version, tuple(words), gauss if has_gauss else None)
+    try:
+        Random().setstate(rng_state)
+    except (ValueError, TypeError):
+        raise SaveError("Saved game has a broken generator state")
+
+    if engine is None:
+        engine = GameEngine(width, height)
+    elif (engine.HEIGHT, engine.WIDTH) != (height, width):
+        raise SaveError(f"Saved game is {width}x{height}, the board is {engine.WIDTH}x{engine.HEIGHT}")
+    engine.COLORS_ON_FIELD, engine.SPAWN_PER_TURN, engine.ITEMS_IN_LINE = colors, spawn, in_line
+
+    engine.load_grid(grid)
+    engine.empty_index.load(order)
+    engine.next_colors = next_colors
+    engine.next_positions = next_positions
+    engine.rng.setstate(rng_state)
+    engine.score, engine.turns, engine.status = score, turns, status
+    engine.history.clear()
+    return engine, seed
+
+
+def write_atomic(path: str, data: bytes):
+    """Replace the file at path with data, a crash leaves either the old or the new content"""
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+class AutoSaver:
+    """Writes saved games to a file on a background thread.
+
+    save() only hands the bytes over. When saves come faster than the disk takes them,
+    the older pending one is skipped and only the latest gets written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.saved = 0
+        # Last failed write, the next save tries again
+        self.error = None
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def save(self, data: bytes):
+        with self._condition:
+            self._pending = data
+            self._condition.notify()
+
+    def close(self):
+        """Write what is pending and stop the thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                data, self._pending = self._pending, None
+                if data is None:
+                    return
+            try:
+                write_atomic(self.path, data)
+            except OSError as e:
+                self.error = e
+            else:
+                self.saved += 1
@@ -0,0 +1,268 @@
+from collections import OrderedDict
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+from engine import GameEngine
+from enums import GameStatus
+from history import TurnDelta
+from pathfinding import bits_to_mask
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Zobrist:
+    """Random 64 bit keys of (cell, color) pairs, a position hashes to the xor of its keys.
+
+    Column 0 stands for an empty cell and is all zeros, so only balls contribute.
+    Announced balls have keys of their own, they are part of the position too.
+    """
+
+    def __init__(self, size: int, colors: int, seed: int = 0):
+        rng = Random(seed)
+        self.cells = [[0] + [rng.getrandbits(64) for _ in range(colors)] for _ in range(size)]
+        self.announced = [[0] + [rng.getrandbits(64) for _ in range(colors)] for _ in range(size)]
+
+    def board(self, grid: np.ndarray):
+        key = 0
+        for index, color in enumerate(grid.ravel().tolist()):
+            key ^= self.cells[index][color + 1]
+        return key
+
+    def update(self, changes: list):
+        """Xor to apply (index, before, after, slot) cell changes recorded by GameEngine.set_cell to a key"""
+        cells = self.cells
+        key = 0
+        for index, before, after, _ in changes:
+            key ^= cells[index][before + 1] ^ cells[index][after + 1]
+        return key
+
+    def next_positions(self, positions: list, width: int):
+        key = 0
+        for y, x, color in positions:
+            key ^= self.announced[y * width + x][color + 1]
+        return key
+
+
+class TranspositionTable:
+    """Values of searched positions with the depth they were searched to.
+
+    Holds at most capacity entries, the least recently used one is evicted first.
+    """
+
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: int, depth: int):
+        """Value of a position searched at least depth plies deep or None"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: int, depth: int, value: float):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > depth:
+            return
+        self.entries[key] = (depth, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+class ExpectimaxSolver:
+    """Several plies of lookahead averaging over the random spawns.
+
+    A ply is our move followed by the spawn of the announced balls and the announcement of
+    the next ones. The announcement is random, so chance nodes average CHANCE_SAMPLES draws of it.
+    Draws are seeded by the position key, so a position always gets the same ones and
+    transposition table values stay consistent. Moves are applied to a copy of the engine
+    and undone, so every rule comes from GameEngine. The copy records its cell changes, they
+    update the position key and are reverted to undo a move, so a node costs what it changed.
+
+    Max nodes only look at their most promising moves. Leaves are valued by empty cells
+    and by the squared length of every run of two or more balls, both kept up to date by the engine.
+    """
+    ROOT_MOVES = 12
+    MOVES_PER_NODE = 4
+    CHANCE_SAMPLES = 2
+    EMPTY_WEIGHT = 1.0
+    POTENTIAL_WEIGHT = 0.1
+    LOSS = -1000.0
+
+    def __init__(self, max_depth: int = 3, table_capacity: int = 100_000, seed: int = 0):
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_capacity)
+        self.seed = seed
+        self.zobrist = None
+        self.engine = None
+        self.key = 0
+        self.deadline = 0.0
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def solve(self, engine: GameEngine, budget: float = 1.0):
+        """(move, value) of the deepest search finished within budget seconds, move is None if no ball can move.
+
+        Iterative deepening: depth 1 always completes, deeper searches stop at the deadline
+        and then the result of the last completed depth is returned.
+        """
+        self.deadline = perf_counter() + budget
+        self.engine = engine.copy()
+        self.engine.recording = TurnDelta()
+        if (self.zobrist is None or len(self.zobrist.cells) != engine.grid.size or
+                len(self.zobrist.cells[0]) != engine.COLORS_ON_FIELD + 1):
+            self.zobrist = Zobrist(engine.grid.size, engine.COLORS_ON_FIELD, self.seed)
+            self.table.clear()
+        self.key = self.zobrist.board(self.engine.grid)
+        self.nodes = 0
+        self.depth_reached = 0
+
+        best = None, None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best = self._root(depth, best[0], timed=depth > 1)
+            except _Timeout:
+                break
+            self.depth_reached = depth
+        return best
+
+    def evaluate(self):
+        """Heuristic value of the position of the engine"""
+        potential = sum(self.engine.runs.potential.values())
+        return self.EMPTY_WEIGHT * self.engine.empty_count + self.POTENTIAL_WEIGHT * potential
+
+    def moves(self, limit: int, first: tuple = None):
+        """Up to limit legal moves, longest runs they make first"""
+        engine = self.engine
+        grid = engine.grid
+        width, size = engine.WIDTH, grid.size
+        runs = engine.runs.placement_lengths(engine.COLORS_ON_FIELD).reshape(engine.COLORS_ON_FIELD, size)
+
+        candidates = []
+        targets = {}
+        for start in engine.filled_cells():
+            bits = engine.reachability.reachable_from(start[0] * width + start[1])
+            if not bits:
+                continue
+            # Balls of a color next to the same empty area share their best targets
+            color = int(grid[start])
+            best = targets.get((bits, color))
+            if best is None:
+                cells = np.flatnonzero(bits_to_mask(bits, size))
+                scores = runs[color, cells]
+                if len(cells) > limit:
+                    top = np.argpartition(-scores, limit)[:limit]
+                    cells, scores = cells[top], scores[top]
+                best = targets[bits, color] = [(score, divmod(end, width))
+                                               for score, end in zip(scores.tolist(), cells.tolist())]
+            candidates.extend((score, start, end) for score, end in best)
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        moves = [(start, end) for _, start, end in candidates]
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves[:limit]
+
+    def _position_key(self):
+        return self.key ^ self.zobrist.next_positions(self.engine.next_positions, self.engine.WIDTH)
+
+    def _root(self, depth: int, first: tuple, timed: bool):
+        best, best_value = None, None
+        for move in self.moves(self.ROOT_MOVES, first):
+            value = self._after_move(move, depth, timed)
+            if best_value is None or value > best_value:
+                best, best_value = move, value
+        return best, best_value
+
+    def _max(self, depth: int, timed: bool):
+        if timed and perf_counter() > self.deadline:
+            raise _Timeout
+        self.nodes += 1
+        if depth == 0:
+            return self.evaluate()
+
+        key = self._position_key()
+        value = self.table.get(key, depth)
+        if value is not None:
+            return value
+
+        moves = self.moves(self.MOVES_PER_NODE)
+        if moves:
+            value = max(self._after_move(move, depth, timed) for move in moves)
+        else:
+            value = self.evaluate()
+        self.table.put(key, depth, value)
+        return value
+
+    def _after_move(self, move: tuple, depth: int, timed: bool):
+        """Expected value of playing move, depth counting this ply"""
+        engine = self.engine
+        start, end = move
+        state = self._save()
+        try:
+            engine.relocate(start, end)
+            lines = engine.lines_through(*end)
+            if lines:
+                # No spawn after a cleared line, so nothing random happens in this ply
+                gain = engine.clear_lines(lines)
+                self._update_key(state[0])
+                return gain + self._max(depth - 1, timed)
+
+            self._update_key(state[0])
+            moved = self._save()
+            seed = self._position_key()
+            total = 0.0
+            for sample in range(self.CHANCE_SAMPLES):
+                engine.rng = Random(seed + sample)
+                engine.spawn()
+                self._update_key(moved[0])
+                try:
+                    if engine.status == GameStatus.LOST:
+                        total += self.LOSS
+                    else:
+                        total += engine.score - moved[4] + self._max(depth - 1, timed)
+                finally:
+                    self._restore(moved)
+            return total / self.CHANCE_SAMPLES
+        finally:
+            self._restore(state)
+
+    def _save(self):
+        """State to _restore(), starting with how many cell changes are recorded so far"""
+        engine = self.engine
+        return (len(engine.recording.cells), list(engine.next_positions), list(engine.next_colors), engine.rng,
+                engine.score, engine.status, self.key)
+
+    def _update_key(self, mark: int):
+        """Xor the position key with the cell changes recorded after mark"""
+        self.key ^= self.zobrist.update(self.engine.recording.cells[mark:])
+
+    def _restore(self, state: tuple):
+        engine = self.engine
+        mark, engine.next_positions, engine.next_colors, engine.rng, engine.score, engine.status, self.key = state
+        recording = engine.recording
+        engine.recording = None
+        try:
+            engine.revert_cells(recording.cells[mark:])
+        finally:
+            del recording.cells[mark:]
+            engine.recording = recording
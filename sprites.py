@@ -0,0 +1,70 @@
+from PyQt5.QtCore import QPointF, QRectF, QMarginsF, Qt
+from PyQt5.QtGui import QColor, QPainter, QPixmap, QRadialGradient
+
+
+class SpriteCache:
+    """Pre-rendered balls with their shadows, one pixmap per look.
+
+    A sprite covers a whole square cell, so painting a ball is a single drawPixmap.
+    Sprites are keyed by color, cell size in pixels, size modifier of the pulse and
+    whether it is a preview of a next ball, which is drawn smaller.
+    """
+    BALL_MARGIN = 10
+    PREVIEW_MARGIN = 30
+
+    def __init__(self):
+        self._sprites = {}
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def get(self, color: QColor, size: int, modifier: float = 1, preview: bool = False, ratio: float = 1.0):
+        key = (color.rgba(), size, modifier, preview, ratio)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = self.render(color, size, modifier, preview, ratio)
+        return sprite
+
+    def discard_size(self, size: int):
+        """Drop sprites of a cell size no longer used"""
+        for key in [key for key in self._sprites if key[1] == size]:
+            del self._sprites[key]
+
+    def retain_colors(self, colors):
+        """Drop sprites of colors not among colors"""
+        keep = {QColor(color).rgba() for color in colors}
+        for key in [key for key in self._sprites if key[0] not in keep]:
+            del self._sprites[key]
+
+    def clear(self):
+        self._sprites.clear()
+
+    def render(self, color: QColor, size: int, modifier: float, preview: bool, ratio: float):
+        pixmap = QPixmap(round(size * ratio), round(size * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+
+        pct = size * 0.01
+        margin = (self.PREVIEW_MARGIN if preview else self.BALL_MARGIN) * pct / modifier
+        rect = QRectF(0, 0, size, size).marginsRemoved(QMarginsF(margin, margin, margin, margin))
+        shadow_rect = QRectF(rect)
+        shadow_rect.translate(QPointF(-pct, pct))
+        shadow_rect.adjust(-2 * pct, 2 * pct, 0, 2 * pct)
+
+        shadow_color = QColor("#000000")
+        shadow_color.setAlpha(100)
+
+        gradient = QRadialGradient(QPointF(0.7 * size, 0.3 * size), size)
+        gradient.setColorAt(0.05, color.lighter(150))
+        gradient.setColorAt(0.49, color)
+        gradient.setColorAt(1.0, color.darker(450))
+
+        painter = QPainter(pixmap)
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(shadow_color)
+        painter.drawEllipse(shadow_rect)
+        painter.setBrush(gradient)
+        painter.drawEllipse(rect)
+        painter.end()
+        return pixmap
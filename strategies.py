@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+
+from engine import GameEngine
+from solver import ExpectimaxSolver
+
+
+class Strategy:
+    """Picks a move for a GameEngine position"""
+    name = ""
+
+    def __init__(self, rng: random.Random = None):
+        self.rng = rng or random.Random()
+
+    def legal_moves(self, engine: GameEngine):
+        """Every (start, end) pair of a ball and an empty cell it can get to"""
+        moves = []
+        for start in engine.filled_cells():
+            for end in np.argwhere(engine.reachable_mask(start)).tolist():
+                moves.append((start, tuple(end)))
+        return moves
+
+    def choose(self, engine: GameEngine):
+        """(start, end) to play or None if no ball can move"""
+        raise NotImplementedError
+
+
+class RandomStrategy(Strategy):
+    name = "random"
+
+    def choose(self, engine: GameEngine):
+        balls = engine.filled_cells()
+        self.rng.shuffle(balls)
+        for start in balls:
+            targets = np.argwhere(engine.reachable_mask(start)).tolist()
+            if targets:
+                return start, tuple(self.rng.choice(targets))
+        return None
+
+
+class GreedyStrategy(Strategy):
+    """Moves a ball to where it makes the longest line of its color"""
+    name = "greedy"
+
+    def choose(self, engine: GameEngine):
+        grid = engine.grid
+        best, best_moves = 0, []
+        for start, end in self.legal_moves(engine):
+            length = engine.runs.placement_length(*end, grid[start], ignore=start)
+            if length > best:
+                best, best_moves = length, [(start, end)]
+            elif length == best:
+                best_moves.append((start, end))
+        if not best_moves:
+            return None
+        return self.rng.choice(best_moves)
+
+
+class ExpectimaxStrategy(Strategy):
+    """Plays the move of an ExpectimaxSolver given BUDGET seconds per move"""
+    name = "expectimax"
+    BUDGET = 0.2
+
+    def __init__(self, rng: random.Random = None):
+        super(ExpectimaxStrategy, self).__init__(rng)
+        self.solver = ExpectimaxSolver(seed=self.rng.getrandbits(32))
+
+    def choose(self, engine: GameEngine):
+        move, _ = self.solver.solve(engine, self.BUDGET)
+        return move
+
+
+STRATEGIES = {s.name: s for s in (RandomStrategy, GreedyStrategy, ExpectimaxStrategy)}
@@ -1,132 +1,78 @@
-from itertools import chain
 import numpy as np
 
+from lines import EMPTY
 
-class NpTableContainer:
 
-    def __init__(self, width: int, height: int):
-        self.width = width
-        self.height = height
-        self._container = np.empty((width, height), dtype=object)
-
-    def __len__(self):
-        return len(self._container)
+class TableContainer:
+    """Typed height x width table indexed by (y, x), backed by one NumPy plane.
 
-    def __setitem__(self, key, value):
-        self._container[key] = value
-
-    def __getitem__(self, key):
-        return self._container[key]
+    Views of every row, column, diagonal and anti-diagonal are made once, so reading a
+    board slice neither copies nor allocates. Diagonal k holds cells with x - y == k,
+    anti-diagonal s holds cells with y + x == s, both run with growing y. Views are
+    writable and stay valid as long as the plane is changed in place.
+    """
 
-    def __call__(self):
-        return self._container
-
-
-class PythonTableContainer:
-
-    def __init__(self, width: int, height: int):
-        self.width = width
+    def __init__(self, height: int, width: int, dtype=np.int8, fill=EMPTY):
         self.height = height
-        self._container = [None for _ in range(self.height * self.width)]
-
-    def __call__(self, *args, **kwargs):
-        pos, y, x = None, None, None
-
-        if len(args) == 1:
-            pos = args[0]
-        elif "position" in kwargs:
-            pos = kwargs["position"]
-
-        elif len(args) == 2:
-            y = args[0]
-            x = args[1]
-
-        elif "y" in kwargs and "x" in kwargs:
-            y = kwargs["y"]
-            x = kwargs["x"]
-
-        else:
-            return self._container
-
-        # Define position in container if y and x were provided
-        if not x is None and not y is None:
-            assert 0 <= x < self.width
-            assert 0 <= y < self.height
-            pos = (y * self.height) + x
-
-        if pos:
-            if not 0 <= pos < len(self._container):
-                raise ValueError(
-                    f"Position {pos:1.} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
-            else:
-                return self._container[pos]
+        self.width = width
+        self.plane = np.full((height, width), fill, dtype=dtype)
+        flat = self.plane.reshape(-1)
+
+        self.rows = list(self.plane)
+        self.columns = [self.plane[:, x] for x in range(width)]
+        self.diagonals = []
+        for k in range(1 - height, width):
+            y, x = max(0, -k), max(0, k)
+            length = min(height - y, width - x)
+            start = y * width + x
+            self.diagonals.append(flat[start:start + (length - 1) * (width + 1) + 1:width + 1])
+        self.anti_diagonals = []
+        for s in range(height + width - 1):
+            y, x = max(0, s - width + 1), min(s, width - 1)
+            length = min(height - y, x + 1)
+            start = y * width + x
+            step = max(1, width - 1)
+            self.anti_diagonals.append(flat[start:start + (length - 1) * step + 1:step])
 
-    def __setitem__(self, key, value):
-        self._container[key] = value
+    def __len__(self):
+        return self.height * self.width
 
     def __getitem__(self, key):
-        return self._container[key]
-
-    def __len__(self):
-        return len(self._container)
-
-
-class SlicesTableContainer(PythonTableContainer):
-    def __call__(self, *args, **kwargs):
-        pos, y, x = None, None, None
-
-        if len(args) == 1:
-            pos = args[0]
-        elif "position" in kwargs:
-            pos = kwargs["position"]
-
-        elif len(args) == 2:
-            y = args[0]
-            x = args[1]
-
-        elif "y" in kwargs and "x" in kwargs:
-            y = kwargs["y"]
-            x = kwargs["x"]
-
-        else:
-            raise ValueError("Neither position nor x,y were provided.")
-
-        # Define position in container if y and x were provided
-        if not x is None and not y is None:
-            if isinstance(x, slice) or isinstance(y, slice):
-                y_slice = list(range(self.height))[y]
-                if isinstance(y_slice, int):
-                    y_slice = [y_slice]
-                x_slice = list(range(self.width))[x]
-                if isinstance(x_slice, int):
-                    x_slice = [x_slice]
-
-                sliced_container = [[self._container[self.width * i:self.width * (i + 1)][x] for i in y_slice] for x in
-                                    x_slice]
-                return sliced_container
-
-            else:
-                assert 0 <= x < self.width
-                assert 0 <= y < self.height
-                pos = (y * self.height) + x
-
-        if pos:
-            if not 0 <= pos < len(self._container):
-                raise ValueError(
-                    f"Position {pos:1.} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
-            else:
-                return self._container[pos]
+        return self.plane[key]
 
     def __setitem__(self, key, value):
-        if isinstance(key, int):
-            self._container[key] = value
-        elif isinstance(key, tuple):
-            keys = self(*key)
-            for k in chain.from_iterable(keys):
-                k = value
+        self.plane[key] = value
 
-    def __getitem__(self, key):
-        if isinstance(key, int):
-            return self._container[key]
-        elif isinstance(key, tuple):
-            return self(*key)
+    def __call__(self):
+        return self.plane
+
+    def row(self, y: int):
+        return self.rows[y]
+
+    def column(self, x: int):
+        return self.columns[x]
+
+    def diagonal(self, k: int):
+        """Cells with x - y == k, top left to bottom right"""
+        return self.diagonals[k + self.height - 1]
+
+    def anti_diagonal(self, s: int):
+        """Cells with y + x == s, top right to bottom left"""
+        return self.anti_diagonals[s]
+
+    def line(self, direction: int, y: int, x: int):
+        """View of the line through (y, x) and the index of the cell in it.
+
+        direction 0 to 3 is the row, the column, the diagonal and the anti-diagonal.
+        """
+        if direction == 0:
+            return self.rows[y], x
+        if direction == 1:
+            return self.columns[x], y
+        if direction == 2:
+            return self.diagonals[x - y + self.height - 1], min(y, x)
+        return self.anti_diagonals[y + x], y - max(0, y + x - self.width + 1)
+
+    def lines_through(self, y: int, x: int):
+        """(view, index) of the row, column, diagonal and anti-diagonal through (y, x)"""
+        return tuple(self.line(direction, y, x) for direction in range(4))
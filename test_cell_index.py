@@ -0,0 +1,107 @@
+from random import Random
+
+import numpy as np
+import pytest
+
+from cell_index import EmptyCellIndex
+
+
+def test_starts_with_every_cell():
+    index = EmptyCellIndex(6)
+    assert len(index) == 6
+    assert list(index) == [0, 1, 2, 3, 4, 5]
+    assert all(cell in index for cell in range(6))
+
+
+def test_remove_swaps_with_last():
+    index = EmptyCellIndex(6)
+    index.remove(1)
+    assert list(index) == [0, 5, 2, 3, 4]
+    assert 1 not in index
+    index.remove(0)
+    assert list(index) == [4, 5, 2, 3]
+    # Removing twice changes nothing
+    index.remove(0)
+    assert list(index) == [4, 5, 2, 3]
+
+
+def test_add_appends():
+    index = EmptyCellIndex(6)
+    index.remove(1)
+    index.remove(0)
+    index.add(1)
+    assert list(index) == [4, 5, 2, 3, 1]
+    index.add(1)
+    assert len(index) == 5
+
+
+def test_restore_puts_cell_back_in_its_slot():
+    index = EmptyCellIndex(8)
+    rng = Random(1)
+    for cell in rng.sample(range(8), 3):
+        index.remove(cell)
+    for _ in range(20):
+        before = list(index)
+        cell = rng.choice(before)
+        slot = index.slot(cell)
+        index.remove(cell)
+        index.restore(cell, slot)
+        assert list(index) == before
+
+
+def test_restore_undoes_removals_in_reverse():
+    index = EmptyCellIndex(30)
+    rng = Random(2)
+    before = list(index)
+    removed = []
+    for cell in rng.sample(range(30), 20):
+        removed.append((cell, index.slot(cell)))
+        index.remove(cell)
+    for cell, slot in reversed(removed):
+        index.restore(cell, slot)
+    assert list(index) == before
+
+
+def test_load_keeps_order():
+    index = EmptyCellIndex(6)
+    index.load([4, 0, 2])
+    assert list(index) == [4, 0, 2]
+    assert 1 not in index and 4 in index
+
+
+def test_rebuild():
+    index = EmptyCellIndex(6)
+    index.rebuild(np.array([True, False, True, True, False, False]))
+    assert sorted(index) == [0, 2, 3]
+    assert len(index) == 3
+
+
+def test_picks_follow_order():
+    a, b = EmptyCellIndex(50), EmptyCellIndex(50)
+    for cell in (3, 7, 11):
+        a.remove(cell)
+        b.remove(cell)
+    assert [a.choice(Random(3)) for _ in range(5)] == [b.choice(Random(3)) for _ in range(5)]
+    assert a.sample(10, Random(4)) == b.sample(10, Random(4))
+
+    b.load(sorted(b))
+    assert a.sample(10, Random(4)) != b.sample(10, Random(4))
+
+
+def test_picks_only_empty_cells():
+    index = EmptyCellIndex(20)
+    for cell in range(0, 20, 2):
+        index.remove(cell)
+    rng = Random(5)
+    assert all(index.choice(rng) % 2 for _ in range(50))
+    assert sorted(index.sample(10, rng)) == list(range(1, 20, 2))
+    with pytest.raises(ValueError):
+        index.sample(11, rng)
+
+
+def test_choice_of_full_board():
+    index = EmptyCellIndex(2)
+    index.remove(0)
+    index.remove(1)
+    with pytest.raises(IndexError):
+        index.choice()
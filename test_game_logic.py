@@ -0,0 +1,44 @@
+from random import Random
+
+import pytest
+
+from engine import GameEngine
+from game_logic import GameField
+from savegame import SaveError, dumps
+
+
+def saved_game(colors: int, seed: int = 1):
+    """Saved 10x10 game with rules other than the GameField defaults and every color on the board"""
+    engine = GameEngine(10, 10, Random(seed))
+    engine.COLORS_ON_FIELD, engine.SPAWN_PER_TURN, engine.ITEMS_IN_LINE = colors, 3, 4
+    engine.spawn()
+    for color in range(colors):
+        engine.set_cell(divmod(80 + color, 10), color)
+    return engine, dumps(engine, seed)
+
+
+def test_load_keeps_rules_of_the_save():
+    engine, data = saved_game(7)
+    field = GameField(seed=2)
+    field.load_state(data)
+
+    assert (field.engine.COLORS_ON_FIELD, field.engine.SPAWN_PER_TURN, field.engine.ITEMS_IN_LINE) == (7, 3, 4)
+    assert (field.COLORS_ON_FIELD, field.SPAWN_PER_TURN, field.ITEMS_IN_LINE) == (7, 3, 4)
+    assert len(field.color_items) == 7
+    assert [field.items[divmod(80 + color, 10)].item for color in range(7)] == field.color_items
+    assert (field.engine.grid == engine.grid).all()
+    assert len(field.next_items_positions) == len(engine.next_positions)
+
+    # Playing on uses the loaded rules
+    field.reset()
+    assert field.engine.COLORS_ON_FIELD == 7
+
+
+def test_load_rejects_more_colors_than_the_palette():
+    _, data = saved_game(len(GameField.COLORS) + 1)
+    field = GameField(seed=3)
+    engine = field.engine
+    with pytest.raises(SaveError):
+        field.load_state(data)
+    assert field.engine is engine
+    assert field.COLORS_ON_FIELD == GameField.COLORS_ON_FIELD
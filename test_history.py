@@ -0,0 +1,99 @@
+from random import Random
+
+import numpy as np
+
+from engine import GameEngine
+from history import History, TurnDelta, pack_rng_state
+
+
+def new_game(seed: int, width: int = 9, height: int = 9):
+    engine = GameEngine(width, height, Random(seed))
+    engine.reset(seed)
+    engine.spawn()
+    return engine
+
+
+def play(engine: GameEngine, turns: int, seed: int):
+    """Play random legal moves, returns the snapshot before the first turn and after every one"""
+    rng = Random(seed)
+    snapshots = [snapshot(engine)]
+    for _ in range(turns):
+        moves = [(start, tuple(end)) for start in engine.filled_cells()
+                 for end in np.argwhere(engine.reachable_mask(start)).tolist()]
+        if not moves:
+            break
+        path, _, _ = engine.move(*rng.choice(moves))
+        assert path
+        snapshots.append(snapshot(engine))
+    return snapshots
+
+
+def snapshot(engine: GameEngine):
+    return (engine.grid.tobytes(), engine.score, engine.turns, engine.status, list(engine.next_positions),
+            list(engine.next_colors), engine.rng.getstate(), list(engine.empty_index))
+
+
+def test_undo_redo_all_turns():
+    engine = new_game(1)
+    snapshots = play(engine, 30, seed=2)
+    assert len(snapshots) > 10
+
+    for expected in reversed(snapshots[:-1]):
+        assert engine.undo() is not None
+        assert snapshot(engine) == expected
+    assert engine.undo() is None
+
+    for expected in snapshots[1:]:
+        assert engine.redo() is not None
+        assert snapshot(engine) == expected
+    assert engine.redo() is None
+
+
+def test_play_after_undo_repeats_the_game():
+    engine = new_game(3)
+    snapshots = play(engine, 20, seed=4)
+    while engine.undo() is not None:
+        pass
+    # Same moves from the same position give the same spawns
+    assert play(engine, 20, seed=4) == snapshots
+
+
+def test_partial_undo_then_redo():
+    engine = new_game(5)
+    snapshots = play(engine, 15, seed=6)
+    for _ in range(5):
+        engine.undo()
+    assert snapshot(engine) == snapshots[-6]
+    for _ in range(3):
+        engine.redo()
+    assert snapshot(engine) == snapshots[-3]
+    engine.undo()
+    assert snapshot(engine) == snapshots[-4]
+
+
+def test_delta_keeps_one_generator_state():
+    engine = new_game(7)
+    play(engine, 5, seed=8)
+    delta = engine.history.undo_stack[-1]
+    size = delta.nbytes
+    assert size < 200 + 80 * len(delta.cells) + 4 * 700
+    engine.undo()
+    engine.redo()
+    assert delta.nbytes == size
+
+
+def test_history_drops_oldest_turns():
+    history = History(max_turns=3)
+    deltas = []
+    for _ in range(5):
+        delta = TurnDelta()
+        delta.rng_state = pack_rng_state(Random().getstate())
+        deltas.append(delta)
+        history.push(delta)
+    assert list(history.undo_stack) == deltas[-3:]
+    assert history.nbytes == sum(delta.nbytes for delta in deltas[-3:])
+
+    assert history.undo() is deltas[-1]
+    history.push(deltas[0])
+    assert not history.can_redo
+    assert history.nbytes == sum(delta.nbytes for delta in history.undo_stack)
@@ -0,0 +1,88 @@
+from collections import deque
+from random import Random
+
+import numpy as np
+import pytest
+
+from engine import GameEngine
+from lines import EMPTY
+from pathfinding import bits_to_mask
+from reachability import FILLED, Reachability
+
+
+def reached_by_walk(grid: np.ndarray, start: int):
+    """Bitset of empty cells a ball at start can get to, by a plain breadth-first search"""
+    height, width = grid.shape
+    empty = grid.ravel() == EMPTY
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        y, x = divmod(queue.popleft(), width)
+        for ny, nx in ((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x)):
+            n = ny * width + nx
+            if 0 <= ny < height and 0 <= nx < width and empty[n] and n not in seen:
+                seen.add(n)
+                queue.append(n)
+    seen.discard(start)
+    return sum(1 << n for n in seen)
+
+
+def check(engine: GameEngine, rng: Random):
+    reachability = engine.reachability
+    grid = engine.grid
+    fresh = Reachability(engine.pathfinder)
+    fresh.rebuild(grid)
+
+    assert reachability.empty == fresh.empty
+    assert sorted(reachability.components.values()) == sorted(fresh.components.values())
+    assert ((reachability.labels == FILLED) == (grid.ravel() != EMPTY)).all()
+    for label, bits in reachability.components.items():
+        assert bits
+        assert (bits_to_mask(bits, grid.size) == (reachability.labels == label)).all()
+
+    for _ in range(5):
+        start, end = rng.randrange(grid.size), rng.randrange(grid.size)
+        reached = reached_by_walk(grid, start)
+        assert reachability.reachable_from(start) == reached
+        assert reachability.can_reach(start, end) == bool(reached >> end & 1)
+
+
+@pytest.mark.parametrize("height,width", [(8, 8), (5, 12), (12, 5), (1, 10), (10, 1)])
+def test_random_occupy_vacate(height, width):
+    rng = Random(height * 100 + width)
+    engine = GameEngine(width, height, Random(0))
+    check(engine, rng)
+    for step in range(400):
+        cell = rng.randrange(height), rng.randrange(width)
+        # Keep the board about half full so components keep splitting and merging
+        if engine.grid[cell] == EMPTY:
+            engine.set_cell(cell, rng.randrange(engine.COLORS_ON_FIELD))
+        else:
+            engine.set_cell(cell, EMPTY)
+        check(engine, rng)
+
+
+def test_wall_splits_and_opening_merges():
+    engine = GameEngine(5, 5, Random(0))
+    for y in range(5):
+        engine.set_cell((y, 2), 0)
+    reachability = engine.reachability
+    assert len(reachability.components) == 2
+    assert not reachability.can_reach(0, 4)
+
+    engine.set_cell((4, 2), EMPTY)
+    assert len(reachability.components) == 1
+    assert reachability.can_reach(0, 4)
+
+    # A ball of the wall still reaches both sides
+    assert engine.can_move((0, 2), (0, 1)) and engine.can_move((0, 2), (0, 3))
+
+
+def test_full_board_has_no_components():
+    engine = GameEngine(3, 2, Random(0))
+    for index in range(6):
+        engine.set_cell(divmod(index, 3), 1)
+    assert engine.reachability.components == {}
+    assert engine.reachability.reachable_from(0) == 0
+    engine.set_cell((1, 2), EMPTY)
+    assert engine.reachability.reachable_from(2) == 1 << 5
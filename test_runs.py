@@ -0,0 +1,105 @@
+from random import Random
+
+import numpy as np
+import pytest
+
+from lines import DIRECTIONS, EMPTY, line_masks, line_scores
+from runs import RunLengths
+from tableContainer import TableContainer
+
+COLORS = 3
+
+
+def walked_runs(grid: np.ndarray):
+    """Run lengths of every cell in every direction, counted by walking the grid"""
+    height, width = grid.shape
+    result = np.zeros((len(DIRECTIONS), height, width), dtype=np.int16)
+    for direction, (dy, dx) in enumerate(DIRECTIONS):
+        for y in range(height):
+            for x in range(width):
+                color = grid[y, x]
+                if color == EMPTY:
+                    continue
+                length = 1
+                for sign in (1, -1):
+                    ny, nx = y + dy * sign, x + dx * sign
+                    while 0 <= ny < height and 0 <= nx < width and grid[ny, nx] == color:
+                        length += 1
+                        ny, nx = ny + dy * sign, nx + dx * sign
+                result[direction, y, x] = length
+    return result
+
+
+def walked_placement(grid: np.ndarray, y: int, x: int, color: int, ignore: tuple = None):
+    """Longest line of color a ball put at (y, x) would be part of, counted by walking the grid"""
+    height, width = grid.shape
+    best = 1
+    for dy, dx in DIRECTIONS:
+        length = 1
+        for sign in (1, -1):
+            ny, nx = y + dy * sign, x + dx * sign
+            while 0 <= ny < height and 0 <= nx < width and grid[ny, nx] == color and (ny, nx) != ignore:
+                length += 1
+                ny, nx = ny + dy * sign, nx + dx * sign
+        best = max(best, length)
+    return best
+
+
+def check(runs: RunLengths):
+    grid = runs.board.plane
+    planes = np.stack([r.plane for r in runs.runs])
+    assert (planes == walked_runs(grid)).all()
+
+    rebuilt = RunLengths(TableContainer(*grid.shape))
+    rebuilt.board.plane[:] = grid
+    rebuilt.rebuild()
+    assert (np.stack([r.plane for r in rebuilt.runs]) == planes).all()
+    assert +runs.potential == +rebuilt.potential
+
+    for color in range(COLORS):
+        alone = np.where(grid == color, color, EMPTY)[None]
+        assert runs.potential[color] == line_scores(alone, line_masks(alone, 2))[0]
+
+    placement = runs.placement_lengths(COLORS)
+    balls = [tuple(cell) for cell in np.argwhere(grid != EMPTY).tolist()]
+    for y, x in np.argwhere(grid == EMPTY).tolist():
+        for color in range(COLORS):
+            length = walked_placement(grid, y, x, color)
+            assert placement[color, y, x] == runs.placement_length(y, x, color) == length
+        # Moving a ball there, its own cell is left empty
+        for start in balls:
+            color = int(grid[start])
+            assert runs.placement_length(y, x, color, ignore=start) == walked_placement(grid, y, x, color, start)
+
+
+@pytest.mark.parametrize("height,width", [(7, 7), (5, 11), (11, 5), (1, 8), (8, 1), (2, 3)])
+def test_random_place_remove(height, width):
+    rng = Random(height * 100 + width)
+    runs = RunLengths(TableContainer(height, width))
+    board = runs.board
+    check(runs)
+    for step in range(300):
+        y, x = rng.randrange(height), rng.randrange(width)
+        color = int(board[y, x])
+        if color == EMPTY:
+            color = rng.randrange(COLORS)
+            board[y, x] = color
+            runs.place(y, x, color)
+        else:
+            board[y, x] = EMPTY
+            runs.remove(y, x, color)
+        if step % 5 == 0 or height * width < 20:
+            check(runs)
+    check(runs)
+
+
+def test_lines_through():
+    runs = RunLengths(TableContainer(6, 9))
+    board = runs.board
+    for y, x in [(0, 8), (1, 7), (2, 6), (3, 5), (4, 4), (4, 3), (4, 2)]:
+        board[y, x] = 1
+        runs.place(y, x, 1)
+    assert runs.longest(4, 4) == 5
+    assert runs.lines_through(4, 4, 5) == [[(0, 8), (1, 7), (2, 6), (3, 5), (4, 4)]]
+    assert runs.lines_through(4, 4, 3) == [[(4, 2), (4, 3), (4, 4)], [(0, 8), (1, 7), (2, 6), (3, 5), (4, 4)]]
+    assert runs.lines_through(5, 0, 1) == []
@@ -0,0 +1,160 @@
+import struct
+from random import Random
+
+import numpy as np
+import pytest
+
+from engine import GameEngine
+from enums import GameStatus
+from savegame import HEADER, RNG_STATE, SaveError, dumps, loads
+
+
+def played_game(seed: int = 1, width: int = 9, height: int = 9, turns: int = 10):
+    engine = GameEngine(width, height, Random(seed))
+    engine.reset(seed)
+    engine.spawn()
+    rng = Random(seed)
+    for _ in range(turns):
+        moves = [(start, tuple(end)) for start in engine.filled_cells()
+                 for end in np.argwhere(engine.reachable_mask(start)).tolist()]
+        if not moves:
+            break
+        engine.move(*rng.choice(moves))
+    return engine
+
+
+def state(engine: GameEngine):
+    return (engine.grid.tobytes(), list(engine.empty_index), engine.next_colors, engine.next_positions,
+            engine.rng.getstate(), engine.score, engine.turns, engine.status, engine.COLORS_ON_FIELD,
+            engine.SPAWN_PER_TURN, engine.ITEMS_IN_LINE)
+
+
+def with_header(data: bytes, **fields):
+    names = ["magic", "version", "width", "height", "colors", "spawn", "in_line", "seed", "score", "turns",
+             "status", "queued", "announced"]
+    header = dict(zip(names, HEADER.unpack_from(data)))
+    header.update(fields)
+    return HEADER.pack(*header.values()) + data[HEADER.size:]
+
+
+def test_round_trip():
+    engine = played_game()
+    restored, seed = loads(dumps(engine, 42))
+    assert seed == 42
+    assert state(restored) == state(engine)
+    assert not restored.history.can_undo
+
+
+def test_round_trip_continues_the_same_game():
+    engine = played_game(seed=2)
+    restored, _ = loads(dumps(engine, 2))
+    for _ in range(3):
+        assert engine.spawn() == restored.spawn()
+    assert state(restored) == state(engine)
+
+
+def test_round_trip_into_engine():
+    engine = played_game(seed=3, width=12, height=7)
+    target = GameEngine(12, 7)
+    assert loads(dumps(engine, 0), target)[0] is target
+    assert state(target) == state(engine)
+
+    with pytest.raises(SaveError):
+        loads(dumps(engine, 0), GameEngine(7, 12))
+
+
+def test_large_board_uses_wide_cell_indices():
+    engine = GameEngine(300, 300, Random(4))
+    engine.spawn()
+    restored, _ = loads(dumps(engine, 4))
+    assert state(restored) == state(engine)
+
+
+def test_truncated():
+    data = dumps(played_game(seed=5), 5)
+    for length in range(len(data)):
+        with pytest.raises(SaveError):
+            loads(data[:length])
+    with pytest.raises(SaveError):
+        loads(data + b"\0")
+
+
+@pytest.mark.parametrize("fields", [
+    {"magic": b"XXXX"},
+    {"version": 99},
+    {"status": 200},
+    {"colors": 0},
+    {"spawn": 0},
+    {"in_line": 0},
+])
+def test_bad_header(fields):
+    with pytest.raises(SaveError):
+        loads(with_header(dumps(played_game(seed=6), 6), **fields))
+
+
+def test_bad_grid_color():
+    data = bytearray(dumps(played_game(seed=7), 7))
+    cell = HEADER.size + next(i for i in range(81) if data[HEADER.size + i] != 0xFF)
+    data[cell] = 5
+    with pytest.raises(SaveError):
+        loads(bytes(data))
+    data[cell] = 0x80
+    with pytest.raises(SaveError):
+        loads(bytes(data))
+
+
+def test_bad_empty_order():
+    engine = played_game(seed=8)
+    data = bytearray(dumps(engine, 8))
+    offset = HEADER.size + engine.grid.size
+    # Two empty cells listed twice
+    data[offset:offset + 2] = data[offset + 2:offset + 4]
+    with pytest.raises(SaveError):
+        loads(bytes(data))
+
+
+def test_bad_announced_balls():
+    engine = played_game(seed=9)
+    assert engine.next_positions and engine.next_colors == []
+    data = dumps(engine, 9)
+    offset = len(data) - RNG_STATE.size - 3 * len(engine.next_positions)
+
+    outside = bytearray(data)
+    struct.pack_into("<H", outside, offset, engine.grid.size)
+    with pytest.raises(SaveError):
+        loads(bytes(outside))
+
+    unknown = bytearray(data)
+    unknown[offset + 2] = engine.COLORS_ON_FIELD
+    with pytest.raises(SaveError):
+        loads(bytes(unknown))
+
+
+def test_bad_queued_color():
+    engine = played_game(seed=10)
+    engine.next_colors = [engine.COLORS_ON_FIELD]
+    with pytest.raises(SaveError):
+        loads(dumps(engine, 10))
+
+
+def test_bad_generator_state():
+    data = bytearray(dumps(played_game(seed=11), 11))
+    # The last word of the Mersenne Twister state is its position, at most 624
+    struct.pack_into("<I", data, len(data) - RNG_STATE.size + 1 + 624 * 4, 10_000)
+    with pytest.raises(SaveError):
+        loads(bytes(data))
+
+
+def test_failed_load_leaves_engine_alone():
+    engine = played_game(seed=12)
+    before = state(engine)
+    data = with_header(dumps(played_game(seed=13), 13), status=200)
+    with pytest.raises(SaveError):
+        loads(data, engine)
+    assert state(engine) == before
+
+
+def test_lost_game_round_trip():
+    engine = played_game(seed=14)
+    engine.status = GameStatus.LOST
+    assert loads(dumps(engine, 14))[0].status == GameStatus.LOST
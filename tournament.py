@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import random
+from collections import Counter, defaultdict
+from multiprocessing import Pool, cpu_count
+from statistics import mean, median
+from time import perf_counter
+
+from dataset import DatasetWriter
+from engine import GameEngine
+from enums import GameStatus
+from strategies import STRATEGIES
+
+# Engines of a worker process, reused between games of the same board size
+_engines = {}
+# Dataset writers of a worker process, one store per strategy and board size
+_writers = {}
+
+
+def _writer(dataset: str, strategy_name: str, width: int, height: int):
+    key = strategy_name, width, height
+    if key not in _writers:
+        path = os.path.join(dataset, f"{strategy_name}-{width}x{height}-{os.getpid()}")
+        _writers[key] = DatasetWriter(path, width, height)
+    return _writers[key]
+
+
+def play_game(task: tuple):
+    """Play one seeded game in a worker, task is (strategy, seed, width, height, max_turns, dataset).
+
+    With a dataset directory every turn is stored there, game ids being seeds.
+    """
+    strategy_name, seed, width, height, max_turns, dataset = task
+    engine = _engines.get((width, height))
+    if engine is None:
+        engine = _engines[width, height] = GameEngine(width, height)
+    writer = _writer(dataset, strategy_name, engine.WIDTH, engine.HEIGHT) if dataset else None
+
+    strategy = STRATEGIES[strategy_name](random.Random(seed))
+    lines = Counter()
+    started = perf_counter()
+
+    engine.reset(seed)
+    board = engine.grid.copy() if writer is not None else None
+    spawned, cleared = engine.spawn()
+    lines.update(len(line) for line in cleared)
+    if writer is not None:
+        writer.append_turn(seed, board, None, None, engine, spawned, cleared)
+    while engine.status == GameStatus.RUNNING and engine.turns < max_turns:
+        move = strategy.choose(engine)
+        if move is None:
+            break
+        if writer is not None:
+            board = engine.grid.copy()
+        _, spawned, cleared = engine.move(*move)
+        lines.update(len(line) for line in cleared)
+        if writer is not None:
+            writer.append_turn(seed, board, *move, engine, spawned, cleared)
+    if writer is not None:
+        # Workers are not shut down cleanly, so every finished game is flushed
+        writer.flush()
+
+    return {
+        "strategy": strategy_name,
+        "seed": seed,
+        "score": engine.score,
+        "turns": engine.turns,
+        "lines": {str(length): count for length, count in sorted(lines.items())},
+        "seconds": perf_counter() - started,
+    }
+
+
+def run_tournament(strategies: list, games: int, seed: int = 0, width: int = 0, height: int = 0,
+                   max_turns: int = 1000, workers: int = 0, dataset: str = None):
+    """Yield results of every game as soon as it finishes.
+
+    Every strategy plays the same seeds, so they face the same spawns as long as their moves agree.
+    With dataset, every worker appends the turns it plays to stores in that directory.
+    """
+    tasks = [(name, seed + i, width, height, max_turns, dataset) for i in range(games) for name in strategies]
+    with Pool(workers or cpu_count()) as pool:
+        yield from pool.imap_unordered(play_game, tasks)
+
+
+def summarize(results: list):
+    """Aggregate statistics per strategy"""
+    by_strategy = defaultdict(list)
+    for result in results:
+        by_strategy[result["strategy"]].append(result)
+
+    summary = {}
+    for name, games in by_strategy.items():
+        scores = [g["score"] for g in games]
+        turns = [g["turns"] for g in games]
+        lines = Counter()
+        for g in games:
+            lines.update({int(length): count for length, count in g["lines"].items()})
+        seconds = sum(g["seconds"] for g in games)
+        summary[name] = {
+            "games": len(games),
+            "score_mean": mean(scores),
+            "score_median": median(scores),
+            "score_max": max(scores),
+            "turns_mean": mean(turns),
+            "lines": {str(length): count for length, count in sorted(lines.items())},
+            "turns_per_second": sum(turns) / seconds if seconds else 0.0,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded self-play of Lines move strategies")
+    parser.add_argument("-s", "--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("-g", "--games", type=int, default=100, help="games per strategy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--width", type=int, default=GameEngine.WIDTH)
+    parser.add_argument("--height", type=int, default=GameEngine.HEIGHT)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("-w", "--workers", type=int, default=0, help="worker processes, all cores by default")
+    parser.add_argument("--dataset", help="directory to store every played turn in, see dataset.py")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print every game")
+    args = parser.parse_args()
+
+    started = perf_counter()
+    results = []
+    for result in run_tournament(args.strategies, args.games, args.seed, args.width, args.height,
+                                 args.max_turns, args.workers, args.dataset):
+        results.append(result)
+        if not args.quiet:
+            print(json.dumps(result))
+
+    elapsed = perf_counter() - started
+    print(json.dumps(summarize(results), indent=2))
+    print(f"{len(results)} games, {sum(r['turns'] for r in results)} turns in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()